@@ -0,0 +1,264 @@
+import numpy as np
+from orientations import ORIENTATIONS, PIECES, TRANSFORMS
+
+BOARD_SIZE = 20
+NUM_PIECES = 21
+NUM_TRANSFORMS = 8
+NUM_CELLS = BOARD_SIZE * BOARD_SIZE
+# An action is ((piece_id - 1) * NUM_TRANSFORMS + transform) * NUM_CELLS + row * BOARD_SIZE + col,
+# where (row, col) is the top left corner of the piece, like in the moves of HeadlessGame
+NUM_ACTIONS = NUM_PIECES * NUM_TRANSFORMS * NUM_CELLS
+
+# Same order as GameBoard's start corners
+_START_CORNERS = (
+    (0, BOARD_SIZE - 1),
+    (BOARD_SIZE - 1, BOARD_SIZE - 1),
+    (BOARD_SIZE - 1, 0),
+    (0, 0),
+)
+# The squares of a piece are at most 4 rows or columns from its top left corner
+_PAD = 4
+_MAX_SQUARES = 5
+
+
+def _canonical_transforms() -> list[list[tuple[int, int]]]:
+    """
+    Finds the (piece_id - 1, transform) slots of every orientation. Only the
+    first transform that gives an orientation is used, so that every legal
+    action is a different move.
+    """
+    slots = [[] for _ in range(len(PIECES))]
+    for piece_id in range(1, len(PIECES)):
+        seen = set()
+        for transform, orientation in enumerate(TRANSFORMS[piece_id]):
+            if orientation.index not in seen:
+                seen.add(orientation.index)
+                slots[piece_id].append((piece_id - 1, transform))
+    return slots
+
+
+_SLOTS = _canonical_transforms()
+
+# (piece_id - 1, transform, square) -> offset of the square, and whether the
+# piece has that many squares. Used to place the pieces of every board at once.
+_SQUARE_ROWS = np.zeros((NUM_PIECES, NUM_TRANSFORMS, _MAX_SQUARES), np.int64)
+_SQUARE_COLS = np.zeros((NUM_PIECES, NUM_TRANSFORMS, _MAX_SQUARES), np.int64)
+_SQUARE_USED = np.zeros((NUM_PIECES, NUM_TRANSFORMS, _MAX_SQUARES), bool)
+for _piece_id in range(1, len(PIECES)):
+    for _transform, _orientation in enumerate(TRANSFORMS[_piece_id]):
+        for _square, (_row, _col) in enumerate(_orientation.cells):
+            _SQUARE_ROWS[_piece_id - 1, _transform, _square] = _row
+            _SQUARE_COLS[_piece_id - 1, _transform, _square] = _col
+            _SQUARE_USED[_piece_id - 1, _transform, _square] = True
+_PIECE_SIZES = np.array([piece.size for piece in PIECES[1:]], np.int64)
+
+
+def action_to_move(action: int) -> tuple[int, int, int, int]:
+    """Converts an action into a (piece_id, orientation, row, col) move of HeadlessGame."""
+    # Actions taken from the mask are NumPy integers, which the game can't use
+    slot, cell = divmod(int(action), NUM_CELLS)
+    piece_index, transform = divmod(slot, NUM_TRANSFORMS)
+    row, col = divmod(cell, BOARD_SIZE)
+    return piece_index + 1, TRANSFORMS[piece_index + 1][transform].index, row, col
+
+
+def move_to_action(piece_id: int, orientation: int, row: int, col: int) -> int:
+    """Converts a (piece_id, orientation, row, col) move of HeadlessGame into an action."""
+    for piece_index, transform in _SLOTS[piece_id]:
+        if TRANSFORMS[piece_id][transform].index == orientation:
+            slot = piece_index * NUM_TRANSFORMS + transform
+            return slot * NUM_CELLS + row * BOARD_SIZE + col
+    raise ValueError(f"piece {piece_id} doesn't have orientation {orientation}")
+
+
+class BatchEnv:
+    """
+    Plays num_envs games of Blokus in lockstep with NumPy arrays, following
+    the same rules and turn order as HeadlessGame. Every board is an array
+    of square owners (-1 for empty), and the legal actions of the player to
+    move on every board are worked out with array operations over all of
+    the boards at once.
+
+    The legal action mask is computed after every step anyway, to find the
+    players that have to pass, so reading it is free.
+    """
+
+    def __init__(self, num_envs: int, num_players: int = 4):
+        self._num_envs = num_envs
+        self._num_players = num_players
+        self._boards = np.full((num_envs, BOARD_SIZE, BOARD_SIZE), -1, np.int8)
+        # remaining[env, player, piece_id - 1] is set while the piece is left
+        self._remaining = np.ones((num_envs, num_players, NUM_PIECES), bool)
+        self._placed = np.zeros((num_envs, num_players), bool)
+        self._has_legal_moves = np.ones((num_envs, num_players), bool)
+        self._last_pieces = np.zeros((num_envs, num_players), np.int8)
+        self._current_players = np.zeros(num_envs, np.int8)
+        self._done = np.zeros(num_envs, bool)
+        self._mask = np.zeros((num_envs, NUM_ACTIONS), bool)
+        self.reset()
+
+    @property
+    def num_envs(self):
+        return self._num_envs
+
+    @property
+    def num_players(self):
+        return self._num_players
+
+    @property
+    def boards(self) -> np.ndarray:
+        """(num_envs, 20, 20) owners of the squares, -1 for empty ones. Shouldn't be changed."""
+        return self._boards
+
+    @property
+    def remaining(self) -> np.ndarray:
+        """(num_envs, num_players, 21) masks of the pieces every player has left."""
+        return self._remaining
+
+    @property
+    def current_players(self) -> np.ndarray:
+        return self._current_players
+
+    @property
+    def done(self) -> np.ndarray:
+        return self._done
+
+    def reset(self, envs: np.ndarray | None = None) -> np.ndarray:
+        """Starts new games on some boards, by default all of them, and returns the legal action mask."""
+        if envs is None:
+            envs = np.arange(self._num_envs)
+        envs = np.asarray(envs, np.int64).reshape(-1)
+        self._boards[envs] = -1
+        self._remaining[envs] = True
+        self._placed[envs] = False
+        self._has_legal_moves[envs] = True
+        self._last_pieces[envs] = 0
+        self._current_players[envs] = 0
+        self._done[envs] = False
+        # The first player always has a move on an empty board
+        self._mask[envs] = self._legal_actions(envs)
+        return self._mask
+
+    def legal_action_mask(self) -> np.ndarray:
+        """
+        (num_envs, 21 * 8 * 400) mask of the legal actions of the player to
+        move on every board. Boards whose games are over have no legal actions.
+        """
+        return self._mask
+
+    def step(self, actions: np.ndarray) -> np.ndarray:
+        """
+        Plays an action on every board whose game isn't over, and passes the
+        turn on. Actions of finished boards are ignored. Raises ValueError
+        without changing anything if an action is illegal. Returns done.
+        """
+        actions = np.asarray(actions, np.int64).reshape(self._num_envs)
+        envs = np.flatnonzero(~self._done)
+        actions = actions[envs]
+        if np.any((actions < 0) | (actions >= NUM_ACTIONS)) or not np.all(
+            self._mask[envs, actions]
+        ):
+            raise ValueError("illegal action")
+
+        slots, cells = np.divmod(actions, NUM_CELLS)
+        piece_indices, transforms = np.divmod(slots, NUM_TRANSFORMS)
+        rows, cols = np.divmod(cells, BOARD_SIZE)
+        players = self._current_players[envs]
+
+        # Fills in every square of every piece at once
+        used = _SQUARE_USED[piece_indices, transforms]
+        square_envs = np.broadcast_to(envs[:, None], used.shape)[used]
+        square_rows = (rows[:, None] + _SQUARE_ROWS[piece_indices, transforms])[used]
+        square_cols = (cols[:, None] + _SQUARE_COLS[piece_indices, transforms])[used]
+        square_players = np.broadcast_to(players[:, None], used.shape)[used]
+        self._boards[square_envs, square_rows, square_cols] = square_players
+
+        self._remaining[envs, players, piece_indices] = False
+        self._placed[envs, players] = True
+        self._last_pieces[envs, players] = piece_indices + 1
+        self._next_turn(envs)
+        return self._done
+
+    def scores(self) -> np.ndarray:
+        """(num_envs, num_players) scores, counted like HeadlessGame.scores."""
+        scores = -(self._remaining * _PIECE_SIZES).sum(axis=2)
+        finished = ~self._remaining.any(axis=2)
+        scores += 15 * finished + 5 * (finished & (self._last_pieces == 1))
+        return scores
+
+    def _next_turn(self, envs: np.ndarray) -> None:
+        """Moves every board on to the next player who has a legal move, like HeadlessGame._update_turn."""
+        self._mask[envs] = False
+        for _ in range(self._num_players):
+            if len(envs) == 0:
+                return
+            # Players that had to pass once never move again
+            self._current_players[envs] = (
+                self._current_players[envs] + 1
+            ) % self._num_players
+            players = self._current_players[envs]
+            active = self._has_legal_moves[envs, players]
+            legal = np.zeros((len(envs), NUM_ACTIONS), bool)
+            if active.any():
+                legal[active] = self._legal_actions(envs[active])
+            moved = legal.any(axis=1)
+            self._mask[envs[moved]] = legal[moved]
+            self._has_legal_moves[envs[active & ~moved], players[active & ~moved]] = (
+                False
+            )
+            envs = envs[~moved]
+        # Every player had to pass
+        self._done[envs] = True
+
+    def _legal_actions(self, envs: np.ndarray) -> np.ndarray:
+        """Works out the legal actions of the player to move on some boards."""
+        count = len(envs)
+        players = self._current_players[envs].astype(np.int64)
+        boards = self._boards[envs]
+
+        # Squares outside the board aren't free, and neither are squares that
+        # are taken or next to one of the player's own squares
+        free = np.zeros((count, BOARD_SIZE + _PAD, BOARD_SIZE + _PAD), bool)
+        anchors = np.zeros((count, BOARD_SIZE + _PAD, BOARD_SIZE + _PAD), bool)
+        own = boards == players[:, None, None]
+        sides = np.zeros_like(own)
+        sides[:, 1:] |= own[:, :-1]
+        sides[:, :-1] |= own[:, 1:]
+        sides[:, :, 1:] |= own[:, :, :-1]
+        sides[:, :, :-1] |= own[:, :, 1:]
+        taken = (boards >= 0) | sides
+        free[:, :BOARD_SIZE, :BOARD_SIZE] = ~taken
+
+        # New squares have to touch one of the player's squares by a corner,
+        # or cover the player's start corner on their first move
+        corners = np.zeros_like(own)
+        corners[:, 1:, 1:] |= own[:, :-1, :-1]
+        corners[:, 1:, :-1] |= own[:, :-1, 1:]
+        corners[:, :-1, 1:] |= own[:, 1:, :-1]
+        corners[:, :-1, :-1] |= own[:, 1:, 1:]
+        first = ~self._placed[envs, players]
+        start = np.array(_START_CORNERS, np.int64)[players[first]]
+        corners[np.flatnonzero(first), start[:, 0], start[:, 1]] = True
+        anchors[:, :BOARD_SIZE, :BOARD_SIZE] = corners & ~taken
+
+        remaining = self._remaining[envs, players]
+        legal = np.zeros(
+            (count, NUM_PIECES, NUM_TRANSFORMS, BOARD_SIZE, BOARD_SIZE), bool
+        )
+        for piece_id in range(1, len(PIECES)):
+            has_piece = remaining[:, piece_id - 1]
+            if not has_piece.any():
+                continue
+            for orientation, (piece_index, transform) in zip(
+                ORIENTATIONS[piece_id], _SLOTS[piece_id]
+            ):
+                # fits[env, row, col] if the piece fits with its top left
+                # corner at (row, col), touches if it covers an anchor there
+                fits = np.repeat(has_piece, NUM_CELLS).reshape(count, BOARD_SIZE, -1)
+                touches = np.zeros((count, BOARD_SIZE, BOARD_SIZE), bool)
+                for row, col in orientation.cells:
+                    squares = np.s_[:, row : row + BOARD_SIZE, col : col + BOARD_SIZE]
+                    np.logical_and(fits, free[squares], out=fits)
+                    np.logical_or(touches, anchors[squares], out=touches)
+                np.logical_and(fits, touches, out=legal[:, piece_index, transform])
+        return legal.reshape(count, NUM_ACTIONS)
@@ -0,0 +1,343 @@
+"""
+Times the engine and rendering hot paths on fixed, seeded positions and
+writes the results as JSON, so that two runs can be compared.
+
+Example: python src/benchmarks.py --output before.json
+         python src/benchmarks.py --compare before.json
+"""
+
+import os
+
+# Rendering is benchmarked without opening a window, and the JSON on stdout
+# mustn't start with the pygame greeting
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from collections.abc import Callable
+import pygame
+from graphics_handler import GraphicsHandler
+from headless_game import HeadlessGame
+from orientations import PIECE_SHAPES
+from piece import Piece
+from policies import random_policy
+
+# Fixtures are random games cut off after a number of moves, None plays to the end
+FIXTURES = {"empty": 0, "early": 8, "mid": 32, "late": 64, "over": None}
+
+# Format of the JSON output, bumped when results stop being comparable
+FORMAT_VERSION = 2
+
+# A benchmark gets a fixture and returns the function to time and how many operations it does
+Benchmark = Callable[[HeadlessGame, random.Random], tuple[Callable[[], None], int]]
+
+
+def make_fixture(name: str, seed: int = 0) -> HeadlessGame:
+    """Plays the random game of a fixture, which is the same every time for a seed."""
+    rng = random.Random(f"{seed}:{name}")
+    game = HeadlessGame()
+    moves = FIXTURES[name]
+    while not game.game_over and (moves is None or len(game.history) < moves):
+        game.apply_move(*random_policy(game, rng))
+    return game
+
+
+def _random_pieces(rng: random.Random, count: int) -> list[Piece]:
+    """Makes pieces in random orientations."""
+    pieces = []
+    for _ in range(count):
+        piece_id = rng.randrange(1, 22)
+        piece = Piece([list(row) for row in PIECE_SHAPES[piece_id]], piece_id)
+        for _ in range(rng.randrange(4)):
+            piece.rotate_clockwise()
+        if rng.random() < 0.5:
+            piece.flip_horizontally()
+        pieces.append(piece)
+    return pieces
+
+
+def bench_is_placement_valid(game: HeadlessGame, rng: random.Random):
+    board = game.board
+    pieces = _random_pieces(rng, 1000)
+    checks = [
+        (piece, rng.randrange(20), rng.randrange(20), rng.randrange(4))
+        for piece in pieces
+    ]
+
+    def run():
+        for piece, row, col, player_id in checks:
+            board.is_placement_valid(piece, row, col, player_id)
+
+    return run, len(checks)
+
+
+def bench_can_place_piece(game: HeadlessGame, rng: random.Random):
+    board = game.board
+    checks = [(piece, rng.randrange(4)) for piece in _random_pieces(rng, 200)]
+
+    def run():
+        for piece, player_id in checks:
+            board.can_place_piece(piece, player_id)
+
+    return run, len(checks)
+
+
+def bench_update_shadow(game: HeadlessGame, rng: random.Random):
+    board = game.board
+    # Every hover moves the piece, so the shadow can't be reused
+    hovers = [
+        (piece, rng.randrange(-2, 20), rng.randrange(-2, 20), rng.randrange(4))
+        for piece in _random_pieces(rng, 1000)
+    ]
+
+    def run():
+        for piece, row, col, player_id in hovers:
+            board.update_shadow(piece, row, col, player_id)
+        board.clear_shadow()
+
+    return run, len(hovers)
+
+
+def bench_can_play_move(game: HeadlessGame, rng: random.Random):
+    # Game.can_play_move hands the check on to the headless game. The known
+    # moves are forgotten every time, so that the search itself is timed.
+    # The 1 square piece is taken away too, as its anchors are a move
+    # without any search.
+    game = game.copy()
+    for player in game.players:
+        if player.has_piece(1):
+            player.apply_move(1)
+
+    def run():
+        game.forget_known_moves()
+        for player_id in range(game.num_players):
+            game.can_play_move(player_id)
+
+    return run, game.num_players
+
+
+def bench_can_play_move_cached(game: HeadlessGame, rng: random.Random):
+    # After a move most players still have the legal move found before
+    game = game.copy()
+    for player_id in range(game.num_players):
+        game.can_play_move(player_id)
+
+    def run():
+        for player_id in range(game.num_players):
+            game.can_play_move(player_id)
+
+    return run, game.num_players
+
+
+def bench_update_turn(game: HeadlessGame, rng: random.Random):
+    # The last move of the game is taken back and played again, so that the
+    # turn is passed on until every player that was left is found to be stuck
+    game = game.copy()
+    _, *last_move = game.moves[-1]
+
+    def run():
+        game.undo_move()
+        game.apply_move(*last_move)
+
+    return run, 1
+
+
+def bench_piece_transforms(game: HeadlessGame, rng: random.Random):
+    pieces = _random_pieces(rng, 21)
+
+    def run():
+        for piece in pieces:
+            piece.rotate_clockwise()
+            piece.flip_vertically()
+            piece.rotate_counterclockwise()
+            piece.flip_horizontally()
+
+    return run, 4 * len(pieces)
+
+
+def bench_full_frame(game: HeadlessGame, rng: random.Random):
+    graphics_handler = GraphicsHandler()
+    board = game.board
+
+    def run():
+        # Forget what was drawn, so the whole game screen gets drawn
+        graphics_handler.invalidate_screen()
+        graphics_handler.update_game_screen(board, game.current_player, game.players)
+        graphics_handler.pop_dirty_rects()
+
+    return run, 1
+
+
+def bench_hover_frame(game: HeadlessGame, rng: random.Random):
+    graphics_handler = GraphicsHandler()
+    board = game.board.copy()
+    player_id = game.current_player
+    graphics_handler.update_game_screen(board, player_id, game.players)
+    hovers = [
+        (piece, rng.randrange(20), rng.randrange(20))
+        for piece in _random_pieces(rng, 50)
+    ]
+
+    def run():
+        for piece, row, col in hovers:
+            board.update_shadow(piece, row, col, player_id)
+            graphics_handler.update_game_screen(board, player_id, game.players)
+            graphics_handler.pop_dirty_rects()
+
+    return run, len(hovers)
+
+
+# Every benchmark with the fixtures it runs on, where None means it doesn't use one
+BENCHMARKS: dict[str, tuple[Benchmark, tuple]] = {
+    "is_placement_valid": (bench_is_placement_valid, ("empty", "early", "mid", "late")),
+    "can_place_piece": (bench_can_place_piece, ("empty", "early", "mid", "late")),
+    "update_shadow": (bench_update_shadow, ("empty", "mid", "late")),
+    "can_play_move": (bench_can_play_move, ("empty", "early", "mid", "late")),
+    "can_play_move_cached": (bench_can_play_move_cached, ("mid", "late")),
+    "update_turn_game_over": (bench_update_turn, ("over",)),
+    "piece_transforms": (bench_piece_transforms, (None,)),
+    "update_game_screen_full": (bench_full_frame, ("empty", "late")),
+    "update_game_screen_hover": (bench_hover_frame, ("mid",)),
+}
+
+
+def time_benchmark(
+    run: Callable[[], None], ops: int, repeat: int, min_time: float
+) -> dict:
+    """
+    Times a benchmark repeat times, calling it in a loop for at least min_time
+    each time. Returns nanoseconds per operation.
+    """
+    # Find a number of loops that takes long enough to time accurately
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        if time.perf_counter() - start >= min_time:
+            break
+        loops *= 2
+
+    # Like timeit, keep the garbage collector from adding noise to the timings
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            for _ in range(loops):
+                run()
+            samples.append((time.perf_counter_ns() - start) / (loops * ops))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {
+        "ops": ops,
+        "loops": loops,
+        "best_ns": min(samples),
+        "median_ns": statistics.median(samples),
+        "samples_ns": samples,
+    }
+
+
+def run_benchmarks(
+    selected: list[str] | None, seed: int, repeat: int, min_time: float
+) -> dict:
+    """Runs the benchmarks whose names contain any of the selected strings."""
+    fixtures = {}
+    results = {}
+    for name, (benchmark, fixture_names) in BENCHMARKS.items():
+        for fixture_name in fixture_names:
+            key = name if fixture_name is None else f"{name}[{fixture_name}]"
+            if selected and not any(part in key for part in selected):
+                continue
+            if fixture_name not in fixtures:
+                fixtures[fixture_name] = (
+                    make_fixture(fixture_name, seed) if fixture_name else None
+                )
+            run, ops = benchmark(fixtures[fixture_name], random.Random(key))
+            results[key] = time_benchmark(run, ops, repeat, min_time)
+            print(f"{key:40} {results[key]['best_ns']:12.0f} ns/op", file=sys.stderr)
+
+    return {
+        "version": FORMAT_VERSION,
+        "seed": seed,
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Prints how every benchmark changed since the baseline, returning the ones that got slower."""
+    if (
+        baseline.get("version") != report["version"]
+        or baseline.get("seed") != report["seed"]
+    ):
+        print("The baseline was run with a different version or seed", file=sys.stderr)
+    slower = []
+    for key, result in report["results"].items():
+        if key not in baseline["results"]:
+            continue
+        ratio = result["best_ns"] / baseline["results"][key]["best_ns"]
+        flag = ""
+        if ratio > 1 + threshold:
+            slower.append(key)
+            flag = "  SLOWER"
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{key:40} {ratio:6.2f}x{flag}", file=sys.stderr)
+    return slower
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help=f"only run benchmarks containing these names (available: {', '.join(BENCHMARKS)})",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the fixtures")
+    parser.add_argument("--repeat", type=int, default=5, help="timings per benchmark")
+    parser.add_argument(
+        "--min-time", type=float, default=0.1, help="seconds each timing runs for"
+    )
+    parser.add_argument("--output", default="-", help="JSON output file, - for stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON file to compare to")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change that counts as slower or faster when comparing",
+    )
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    report = run_benchmarks(args.benchmarks, args.seed, args.repeat, args.min_time)
+    pygame.quit()
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        json.dump(report, output, indent=2)
+        output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.compare:
+        with open(args.compare) as file:
+            slower = compare(report, json.load(file), args.threshold)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from game_board import GameBoard
+from orientations import Orientation
+
+
+class BitboardGameBoard(GameBoard):
+    """
+    A GameBoard with the bitmask helpers of the move search, which find the
+    anchors of a player with shifts of their squares' mask instead of
+    looking at the squares around every piece.
+
+    Placing a piece still keeps the board lists and the anchor sets up to
+    date next to the masks, as drawing and the move search read them.
+    """
+
+    def __init__(self, width, height):
+        super().__init__(width, height)
+        # Every square that is actually on the board, without the padding
+        self._board_mask = 0
+        for row in range(height):
+            for col in range(width):
+                self._board_mask |= 1 << ((row + 1) * self._stride + col + 1)
+
+    def _anchor_mask(self, own: int) -> int:
+        """Gets the empty squares touching the given squares by a corner but not by a side."""
+        stride = self._stride
+        edges = own << 1 | own >> 1 | own << stride | own >> stride
+        corners = (
+            own << (stride + 1)
+            | own << (stride - 1)
+            | own >> (stride - 1)
+            | own >> (stride + 1)
+        )
+        return corners & ~edges & ~self._occupied & self._board_mask
+
+    def count_new_anchors(
+        self, orientation: Orientation, row: int, col: int, player_id: int
+    ) -> int:
+        """Counts the anchors that placing an orientation would add for its player."""
+        cells, _, corners = self._placements[orientation.number][
+            row * self._width + col
+        ]
+        own = self._player_masks[player_id]
+        stride = self._stride
+        new_own = own | cells
+        new_edges = new_own << 1 | new_own >> 1 | new_own << stride | new_own >> stride
+        new_anchors = corners & ~new_edges & ~self._occupied & self._board_mask
+        return (new_anchors & ~self._anchor_mask(own)).bit_count()
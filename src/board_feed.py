@@ -0,0 +1,291 @@
+from collections import deque
+from typing import NamedTuple
+from game_board import GameBoard
+from orientations import ALL_PIECES, PIECES
+from player import Player
+
+
+class Delta(NamedTuple):
+    """The changes to a board since the delta before it."""
+
+    sequence: int
+    # (row * width + col, owner) of every square that changed, -1 for emptied squares
+    cells: list[tuple[int, int]]
+    # (player_id, piece_id, used) of every piece that was placed or taken back
+    pieces: list[tuple[int, int, bool]]
+    turn: int | None  # The player to move if it changed, -1 once the game is over
+
+
+class Snapshot(NamedTuple):
+    """The whole state of a board after the delta with the same sequence number."""
+
+    sequence: int
+    width: int
+    height: int
+    cells: list[int]  # Owner of every square by row * width + col, -1 for empty
+    # Bitset of the pieces every player has left, like Player.remaining
+    remaining: list[int]
+    turn: int
+
+
+def to_message(update: Delta | Snapshot) -> dict:
+    """Turns a delta or snapshot into a JSON message for the game server."""
+    return {
+        "type": "delta" if type(update) is Delta else "snapshot",
+        **update._asdict(),
+    }
+
+
+def from_message(message: dict) -> Delta | Snapshot:
+    """Turns a message made by to_message back into a delta or snapshot."""
+    fields = dict(message)
+    kind = fields.pop("type")
+    return Delta(**fields) if kind == "delta" else Snapshot(**fields)
+
+
+class Subscription:
+    """
+    The updates of a feed that one subscriber hasn't read yet. At most
+    max_pending of them are kept: a subscriber that falls further behind
+    loses them all and waits for the feed's next periodic snapshot, or the
+    one sent when the game ends, so a slow reader never holds up the game or
+    makes the feed grow.
+    """
+
+    def __init__(self, feed: "BoardFeed", max_pending: int):
+        self._feed = feed
+        self._queue: deque[Delta | Snapshot] = deque()
+        self._max_pending = max_pending
+        self._lagging = False
+
+    @property
+    def lagging(self):
+        """Whether updates were dropped, so nothing is queued until the next snapshot."""
+        return self._lagging
+
+    @property
+    def pending(self):
+        return len(self._queue)
+
+    def poll(self) -> list[Delta | Snapshot]:
+        """Takes every queued update, oldest first."""
+        updates = list(self._queue)
+        self._queue.clear()
+        return updates
+
+    def close(self) -> None:
+        self._feed.unsubscribe(self)
+
+    def _push(self, update: Delta) -> None:
+        if self._lagging:
+            return
+        if len(self._queue) >= self._max_pending:
+            self._queue.clear()
+            self._lagging = True
+            return
+        self._queue.append(update)
+
+    def _resync(self, snapshot: Snapshot) -> None:
+        self._queue.clear()
+        self._queue.append(snapshot)
+        self._lagging = False
+
+
+class BoardFeed:
+    """
+    Streams the changes to a board as compact, numbered deltas: the squares
+    that changed, the pieces that were used and who is to move. The board
+    collects the changes of a move, and whoever plays the moves publishes
+    them as one delta with flush.
+
+    New subscribers start from a snapshot of the whole board, and every
+    snapshot_interval deltas, as well as with the delta that ends the game,
+    the subscribers that fell behind are sent one.
+    """
+
+    def __init__(
+        self,
+        board: GameBoard,
+        num_players: int,
+        turn: int = 0,
+        remaining: list[int] | None = None,
+        snapshot_interval: int = 16,
+    ):
+        self._board = board
+        self._turn = turn
+        # The board doesn't know which pieces are used, so the feed follows them
+        self._remaining = list(remaining or [ALL_PIECES] * num_players)
+        self._snapshot_interval = snapshot_interval
+        self._sequence = 0
+        self._subscribers: list[Subscription] = []
+        self._snapshot: Snapshot | None = None
+
+        # Changes since the last delta, by square and by (player_id, piece_id)
+        self._cells: dict[int, int] = {}
+        self._pieces: dict[tuple[int, int], bool] = {}
+        self._turn_changed = False
+
+    @property
+    def sequence(self):
+        """The sequence number of the last delta."""
+        return self._sequence
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def subscribe(self, max_pending: int = 64) -> Subscription:
+        """Adds a subscriber, whose first update is a snapshot of the board."""
+        subscription = Subscription(self, max_pending)
+        subscription._resync(self.snapshot())
+        self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscribers:
+            self._subscribers.remove(subscription)
+
+    def record_cells(self, squares: list[tuple[int, int]], owner: int) -> None:
+        """Notes that squares were given a new owner, -1 for emptied ones."""
+        width = self._board.width
+        for row, col in squares:
+            self._cells[row * width + col] = owner
+
+    def record_piece(self, player_id: int, piece_id: int, used: bool) -> None:
+        """Notes that a player used a piece, or got it back."""
+        if used:
+            self._remaining[player_id] &= ~(1 << piece_id)
+        else:
+            self._remaining[player_id] |= 1 << piece_id
+        self._pieces[player_id, piece_id] = used
+
+    def record_turn(self, turn: int) -> None:
+        """Notes the player to move, -1 once the game is over."""
+        if turn != self._turn:
+            self._turn = turn
+            self._turn_changed = True
+
+    def flush(self) -> Delta | None:
+        """Publishes the changes since the last delta, if there are any."""
+        if not (self._cells or self._pieces or self._turn_changed):
+            return None
+        self._sequence += 1
+        delta = Delta(
+            self._sequence,
+            list(self._cells.items()),
+            [(*piece, used) for piece, used in self._pieces.items()],
+            self._turn if self._turn_changed else None,
+        )
+        self._cells = {}
+        self._pieces = {}
+        self._turn_changed = False
+        self._snapshot = None
+
+        for subscription in self._subscribers:
+            subscription._push(delta)
+        # A game that ends before the next interval would otherwise leave
+        # the subscribers that fell behind without its final position
+        if self._sequence % self._snapshot_interval == 0 or delta.turn == -1:
+            lagging = [
+                subscription
+                for subscription in self._subscribers
+                if subscription.lagging
+            ]
+            if lagging:
+                # Built once and shared by everyone who needs it
+                snapshot = self.snapshot()
+                for subscription in lagging:
+                    subscription._resync(snapshot)
+        return delta
+
+    def snapshot(self) -> Snapshot:
+        """
+        Gets the whole state of the board. Deltas hold the new values rather
+        than differences, so a snapshot taken in the middle of a move still
+        agrees with the board once the next delta is applied on top of it.
+        """
+        if self._snapshot is None:
+            board = self._board
+            self._snapshot = Snapshot(
+                self._sequence,
+                board.width,
+                board.height,
+                [owner for row in board.board for owner in row],
+                list(self._remaining),
+                self._turn,
+            )
+        return self._snapshot
+
+
+class BoardMirror:
+    """
+    Rebuilds a board and its players from the snapshots and deltas of a
+    feed, to draw them somewhere else. It has the board, players and
+    current_player of a HeadlessGame, but none of its rules.
+    """
+
+    def __init__(self):
+        self._board: GameBoard | None = None
+        self._players: list[Player] = []
+        self._remaining: list[int] = []
+        self._current_player = 0
+        self._sequence: int | None = None
+
+    @property
+    def board(self):
+        return self._board
+
+    @property
+    def players(self):
+        return self._players
+
+    @property
+    def current_player(self):
+        return self._current_player
+
+    @property
+    def synced(self):
+        """Whether the mirror has had a snapshot and hasn't missed a delta since."""
+        return self._sequence is not None
+
+    def apply(self, update: Delta | Snapshot) -> bool:
+        """
+        Applies an update, returning False if it was skipped because a delta
+        went missing. Nothing is applied again until the next snapshot.
+        """
+        if type(update) is Snapshot:
+            self._board = GameBoard(update.width, update.height)
+            self._board.set_squares(enumerate(update.cells))
+            self._remaining = list(update.remaining)
+            self._players = [
+                self._make_player(player_id)
+                for player_id in range(len(update.remaining))
+            ]
+            self._current_player = update.turn
+            self._sequence = update.sequence
+            return True
+
+        if self._sequence is None or update.sequence != self._sequence + 1:
+            self._sequence = None
+            return False
+        self._sequence = update.sequence
+        self._board.set_squares(update.cells)
+        changed = set()
+        for player_id, piece_id, used in update.pieces:
+            if used:
+                self._remaining[player_id] &= ~(1 << piece_id)
+            else:
+                self._remaining[player_id] |= 1 << piece_id
+            changed.add(player_id)
+        for player_id in changed:
+            self._players[player_id] = self._make_player(player_id)
+        if update.turn is not None:
+            self._current_player = update.turn
+        return True
+
+    def _make_player(self, player_id: int) -> Player:
+        player = Player("", player_id)
+        for piece_id in range(1, len(PIECES)):
+            if not self._remaining[player_id] >> piece_id & 1:
+                player.apply_move(piece_id)
+        return player
@@ -0,0 +1,294 @@
+import math
+import random
+import time
+from game_board import unpack_move
+from headless_game import HeadlessGame
+from orientations import ORIENTATIONS
+from transposition_table import TranspositionTable
+
+
+def greedy_policy(game: HeadlessGame, rng: random.Random) -> tuple[int, int, int, int]:
+    """
+    Plays the largest piece it can, choosing the placement that opens up the
+    most new corner anchors. Ties are broken at random.
+    """
+    player_id = game.current_player
+    board = game.board
+    available_pieces = sorted(
+        game.players[player_id].available_pieces,
+        key=lambda piece_id: len(ORIENTATIONS[piece_id][0].cells),
+        reverse=True,
+    )
+
+    best_moves = []
+    best_size = 0
+    best_anchors = -1
+    for piece_id in available_pieces:
+        size = len(ORIENTATIONS[piece_id][0].cells)
+        if size < best_size:
+            break
+        for move in board.legal_moves(player_id, [piece_id]):
+            _, orientation, row, col = move
+            anchors = board.count_new_anchors(
+                ORIENTATIONS[piece_id][orientation], row, col, player_id
+            )
+            if anchors > best_anchors:
+                best_size, best_anchors, best_moves = size, anchors, [move]
+            elif anchors == best_anchors:
+                best_moves.append(move)
+
+    if not best_moves:
+        raise ValueError("The current player has no legal moves")
+    return rng.choice(best_moves)
+
+
+# The most moves of a single piece that a node will try
+_MOVES_PER_PIECE = 4
+
+
+def _shuffle_key(value: int, salt: int) -> int:
+    """Hashes a value, so that sorting by the hash shuffles values in an order picked by salt."""
+    return ((value ^ salt) * 0x9E3779B1) & 0xFFFFFFFF
+
+
+class _Node:
+    """
+    A position in the search graph. Positions reached through different move
+    orders share the same node, so edges is a list of (move, player_id, node)
+    where player_id is the player that plays the move.
+    """
+
+    __slots__ = ("edges", "untried", "visits", "rewards")
+
+    def __init__(self, num_players: int):
+        self.edges: list[tuple] = []
+        self.untried = None  # Moves are only generated once the node gets expanded
+        self.visits = 0
+        self.rewards = [0.0] * num_players
+
+
+class MonteCarloTreeSearch:
+    """
+    A policy that searches for a move with Monte Carlo tree search, stopping
+    after a number of playouts or a time limit, whichever comes first.
+
+    Playouts are played on a single copy of the game with apply_move and
+    taken back with undo_move. By default a playout plays random moves to
+    the end of the game and scores who won, which only manages about 100
+    playouts a second in Python. Given a playout_depth, playouts stop after
+    that many random moves and score the position by squares placed and
+    corner anchors instead: with a depth of 8 that is about 1,600 playouts a
+    second, at the cost of trusting the heuristic. Nodes only consider the
+    max_children most promising moves, preferring the largest pieces.
+
+    Nodes are kept in a transposition table keyed by the Zobrist key of the
+    position, so transpositions share their statistics and the nodes of the
+    earlier searches of a game are reused by the later ones. Pass
+    table_bits=None to disable it. The order of the candidate moves is picked
+    by seed rather than by the rng, so that the moves played by the other
+    players were usually already searched.
+    """
+
+    def __init__(
+        self,
+        playouts: int | None = 500,
+        time_limit: float | None = None,
+        playout_depth: int | None = None,
+        max_children: int = 24,
+        exploration: float = 1.0,
+        table_bits: int | None = 16,
+        seed: int = 0,
+    ):
+        if playouts is None and time_limit is None:
+            raise ValueError("MonteCarloTreeSearch needs a playout or time budget")
+        self._playouts = playouts
+        self._time_limit = time_limit
+        self._playout_depth = playout_depth
+        self._max_children = max_children
+        self._exploration = exploration
+        self._table = None
+        if table_bits is not None:
+            self._table = TranspositionTable(table_bits)
+        self.last_playouts = 0
+        self.last_nodes = 0  # Nodes created by the last search
+        self._salt = random.Random(seed).getrandbits(32)
+        self._last_ply = 0  # Moves played before the last search
+
+    @property
+    def table(self):
+        return self._table
+
+    def __call__(
+        self, game: HeadlessGame, rng: random.Random
+    ) -> tuple[int, int, int, int]:
+        if self._table is not None:
+            # A new game, or moves taken back: forget the old nodes so that
+            # a game plays out the same however many games came before it
+            if len(game.history) < self._last_ply:
+                self._table.clear()
+            self._table.new_search()
+        self._last_ply = len(game.history)
+        self.last_nodes = 0
+        root = self._get_node(game)
+        deadline = None
+        if self._time_limit is not None:
+            deadline = time.perf_counter() + self._time_limit
+
+        # Every playout plays its moves on the same copy and then takes them back
+        state = game.copy()
+        playouts = 0
+        while self._playouts is None or playouts < self._playouts:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            moves_played = self._run_playout(root, state, rng)
+            for _ in range(moves_played):
+                state.undo_move()
+            playouts += 1
+        self.last_playouts = playouts
+
+        if not root.edges:
+            return greedy_policy(game, rng)
+        return max(root.edges, key=lambda edge: edge[2].visits)[0]
+
+    def _get_node(self, state: HeadlessGame) -> _Node:
+        """Finds the node of a position in the transposition table, or creates it."""
+        if self._table is None:
+            self.last_nodes += 1
+            return _Node(state.num_players)
+
+        key = state.zobrist_key
+        node = self._table.lookup(key)
+        if node is None:
+            node = _Node(state.num_players)
+            self.last_nodes += 1
+            # Nodes closer to the start of the game are reached by more playouts
+            self._table.store(key, node, -len(state.history))
+        return node
+
+    def _run_playout(self, node: _Node, state: HeadlessGame, rng: random.Random) -> int:
+        """Runs one playout and returns the number of moves it played on the state."""
+        moves_played = len(state.history)
+        path = [node]
+
+        # Selection: walk down through fully expanded nodes
+        while node.untried is not None and not node.untried and node.edges:
+            move, _, node = self._select_edge(node)
+            state.apply_move(*move)
+            path.append(node)
+
+        # Expansion: add one of the moves that hasn't been tried yet
+        if not state.game_over:
+            if node.untried is None:
+                node.untried = self._candidate_moves(state, rng)
+            if node.untried:
+                move = node.untried.pop()
+                player_id = state.current_player
+                state.apply_move(*move)
+                child = self._get_node(state)
+                node.edges.append((move, player_id, child))
+                node = child
+                path.append(node)
+
+        # Simulation, to the end of the game unless there is a playout depth
+        depth = 0
+        while not state.game_over and (
+            self._playout_depth is None or depth < self._playout_depth
+        ):
+            state.apply_move(*self._random_move(state, rng))
+            depth += 1
+        rewards = self._evaluate(state)
+
+        # Backpropagation, along the path since a node can have several parents
+        for node in path:
+            node.visits += 1
+            for i, reward in enumerate(rewards):
+                node.rewards[i] += reward
+
+        return len(state.history) - moves_played
+
+    def _select_edge(self, node: _Node) -> tuple:
+        """Picks the edge with the highest UCT value for the player that plays it."""
+        log_visits = math.log(node.visits)
+        best_value = -math.inf
+        best_edge = None
+        for edge in node.edges:
+            child = edge[2]
+            value = child.rewards[edge[1]] / child.visits
+            value += self._exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best_value, best_edge = value, edge
+        return best_edge
+
+    def _candidate_moves(
+        self, state: HeadlessGame, rng: random.Random
+    ) -> list[tuple[int, int, int, int]]:
+        """
+        Gets the moves a node will try. Pieces are listed largest first, in a
+        random order within each size, until there are enough moves.
+
+        The random order is the same in every position, so a move that is a
+        candidate in one position tends to stay one after other moves are
+        played, and the different orders of the same moves meet in the
+        transposition table.
+        """
+        player_id = state.current_player
+        salt = self._salt
+        pieces = sorted(
+            state.players[player_id].available_pieces,
+            key=lambda piece_id: (
+                len(ORIENTATIONS[piece_id][0].cells),
+                _shuffle_key(piece_id, salt),
+            ),
+        )
+
+        # Spreading the moves over several pieces lets a player's candidates
+        # still include most of the others after one of them is played
+        moves = []
+        while pieces and len(moves) < self._max_children:
+            piece_moves = state.board.legal_moves_array(player_id, [pieces.pop()])
+            moves.extend(
+                sorted(piece_moves, key=lambda move: _shuffle_key(move, salt))[
+                    :_MOVES_PER_PIECE
+                ]
+            )
+        return [unpack_move(move) for move in moves[: self._max_children]]
+
+    def _random_move(
+        self, state: HeadlessGame, rng: random.Random
+    ) -> tuple[int, int, int, int]:
+        """
+        Picks a random legal move by guessing a piece, orientation and anchor,
+        falling back to listing every move if the guesses keep failing.
+        """
+        player_id = state.current_player
+        board = state.board
+        available_pieces = state.players[player_id].available_pieces
+        anchors = list(board.corner_anchors(player_id))
+        for _ in range(20):
+            orientation = rng.choice(ORIENTATIONS[rng.choice(available_pieces)])
+            anchor_row, anchor_col = rng.choice(anchors)
+            i, j = rng.choice(orientation.corners)
+            row, col = anchor_row - i, anchor_col - j
+            if (
+                row >= 0
+                and col >= 0
+                and board.is_orientation_valid(orientation, row, col, player_id)
+            ):
+                return orientation.piece_id, orientation.index, row, col
+
+        moves = board.legal_moves_array(player_id, available_pieces)
+        return unpack_move(moves[rng.randrange(len(moves))])
+
+    def _evaluate(self, state: HeadlessGame) -> list[float]:
+        """Scores a position for every player between 0 (worst) and 1 (best)."""
+        if state.game_over:
+            winners = state.winners()
+            return [1.0 if i in winners else 0.0 for i in range(state.num_players)]
+        values = [
+            -player.squares_left + 0.5 * len(state.board.corner_anchors(i))
+            for i, player in enumerate(state.players)
+        ]
+        lowest, highest = min(values), max(values)
+        if highest == lowest:
+            return [0.5] * len(values)
+        return [(value - lowest) / (highest - lowest) for value in values]
@@ -0,0 +1,173 @@
+import cProfile
+import json
+import pstats
+import sys
+import time
+from collections import deque
+from collections.abc import Callable
+from contextlib import contextmanager, nullcontext
+
+# The sections that are always shown, in the order they are shown in
+SECTIONS = ("events", "logic", "computer", "render", "display", "frame")
+
+
+class FrameProfiler:
+    """
+    Times the parts of every frame of the main loop and keeps the times of the
+    last window frames, so that their percentiles can be shown while playing.
+
+    Sections measure exclusive time: the time spent rendering while handling an
+    event counts towards render, not events. The frame section is the total
+    time the frame took before waiting for the next one.
+    """
+
+    def __init__(self, enabled: bool = False, window: int = 600):
+        self._enabled = enabled
+        self._window = window
+        self._times: dict[str, deque] = {
+            name: deque(maxlen=window) for name in SECTIONS
+        }
+        self._max_times = dict.fromkeys(SECTIONS, 0.0)
+        self._frames = 0
+
+        # Times of the current frame, and the time spent in the sections nested
+        # inside each of the sections that are running
+        self._frame_times = dict.fromkeys(SECTIONS, 0.0)
+        self._frame_start = None
+        self._child_times: list[float] = []
+
+        self._capture = None
+        self._capture_frames = 0
+        self._capture_output = None
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled: bool) -> None:
+        self._enabled = enabled
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def capturing(self) -> bool:
+        return self._capture is not None
+
+    def section(self, name: str):
+        """Returns a context manager that adds the time spent in it to a section."""
+        if not self._enabled or self._frame_start is None:
+            return nullcontext()
+        return self._timed_section(name)
+
+    @contextmanager
+    def _timed_section(self, name: str):
+        self._child_times.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._frame_times[name] = (
+                self._frame_times.get(name, 0.0) + elapsed - self._child_times.pop()
+            )
+            if self._child_times:
+                self._child_times[-1] += elapsed
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        """Wraps a function so that every call is timed as part of a section."""
+
+        def wrapper(*args, **kwargs):
+            with self.section(name):
+                return func(*args, **kwargs)
+
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+
+    def instrument(self, obj, name: str, methods: tuple[str, ...]) -> None:
+        """Times the calls to some methods of an object as part of a section."""
+        for method in methods:
+            setattr(obj, method, self.timed(name, getattr(obj, method)))
+
+    def begin_frame(self) -> None:
+        """Starts timing a frame."""
+        if self._enabled:
+            self._frame_start = time.perf_counter()
+
+    def end_frame(self) -> None:
+        """Records the times of the frame, and stops a cProfile capture that has run long enough."""
+        if self._frame_start is not None:
+            self._frame_times["frame"] = time.perf_counter() - self._frame_start
+            for name, elapsed in self._frame_times.items():
+                if name not in self._times:
+                    self._times[name] = deque(maxlen=self._window)
+                    self._max_times[name] = 0.0
+                self._times[name].append(elapsed)
+                self._max_times[name] = max(self._max_times[name], elapsed)
+                self._frame_times[name] = 0.0
+            self._frames += 1
+            self._frame_start = None
+
+        if self._capture is not None:
+            self._capture_frames -= 1
+            if self._capture_frames <= 0:
+                self.stop_capture()
+
+    def percentiles(self, name: str) -> dict[str, float]:
+        """Gets the p50, p95 and p99 of a section over the window in milliseconds, and the all time max."""
+        times = sorted(self._times[name])
+        if not times:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        result = {}
+        for percentile in (50, 95, 99):
+            # Nearest rank percentile
+            rank = max(0, -(-percentile * len(times) // 100) - 1)
+            result[f"p{percentile}"] = times[rank] * 1000
+        result["max"] = self._max_times[name] * 1000
+        return result
+
+    def summary_lines(self) -> list[str]:
+        """Formats the percentiles of every section, one line per section."""
+        return [
+            "{:9}p50 {p50:6.2f}  p95 {p95:6.2f}  p99 {p99:6.2f} ms".format(
+                name, **self.percentiles(name)
+            )
+            for name in self._times
+        ]
+
+    def dump(self, path: str) -> None:
+        """Writes the percentiles of every section to a JSON file."""
+        report = {
+            "frames": self._frames,
+            "window": self._window,
+            "sections": {name: self.percentiles(name) for name in self._times},
+        }
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+
+    def start_capture(self, frames: int, output: str | None = None) -> None:
+        """
+        Runs cProfile for the next number of frames, then writes the stats to
+        output and prints the most expensive functions.
+        """
+        if self._capture is not None:
+            return
+        self._capture = cProfile.Profile()
+        self._capture_frames = frames
+        self._capture_output = output
+        self._capture.enable()
+
+    def stop_capture(self) -> None:
+        """Stops a cProfile capture early."""
+        if self._capture is None:
+            return
+        self._capture.disable()
+        if self._capture_output is not None:
+            self._capture.dump_stats(self._capture_output)
+        stats = pstats.Stats(self._capture, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(25)
+        self._capture = None
@@ -1,202 +1,299 @@
 import pygame
-from game_board import GameBoard
+import random
+import sys
+from board_feed import BoardMirror, from_message
+from frame_profiler import FrameProfiler
+from game_client import GameClient
+from game_record import GameRecordWriter
 from graphics_handler import GraphicsHandler
-from player import Player
-from piece import Piece
+from headless_game import HeadlessGame
+from policies import Policy
+from replay import Replay
 
 
 class Game:
-    """Merges all the parts of the game together."""
-
-    def __init__(self, num_players: int):
-        self._game_state = 0  # 0: start, 1: in game, 2: rules menu, 3: game over
+    """Connects the headless game to pygame input and the graphics handler."""
+
+    def __init__(
+        self,
+        num_players: int,
+        computer_players: dict[int, Policy] | None = None,
+        profiler: FrameProfiler | None = None,
+        recorder: GameRecordWriter | None = None,
+        client: GameClient | None = None,
+        online_game: str = "lobby",
+        spectate: bool = False,
+    ):
+        # 0: start, 1: rules menu, 2: in game, 3: game over, 4: replaying a recorded game
+        self._game_state = 0
         self._num_players = num_players
-        self._board = GameBoard(20, 20)
-        self._current_player = -1
+        # Seats that are played by a policy instead of the mouse and keyboard
+        self._computer_players = computer_players or {}
+        self._rng = random.Random()
+        # Every started game is recorded, the menus' placeholder game isn't
+        self._recorder = recorder
+        self._replay: Replay | None = None
+        # Online games are played on a game server, which sends every move
+        # back, including our own. Only the seat the server gave us is
+        # played from here, and spectators have none.
+        self._client = client
+        self._online_game = online_game
+        self._spectate = spectate
+        self._seat: int | None = None
+        # Scores and winners shown on the game over screen
+        self._result: tuple[list[int], list[int]] = ([], [])
+        self._core = HeadlessGame(num_players)
         self._graphics_handler = GraphicsHandler()
-        self._players: list[Player] = []
-        self._has_legal_moves = [True] * self._num_players
-        for i in range(num_players):
-            self._players.append(Player("", i))
+
+        # Input only changes the state, the screen is redrawn once per frame by
+        # update and only if something changed since the last redraw
+        self._mouse_pos = (0, 0)
+        self._drawn_hover = None
+        self._dirty = True
+
+        # Rendering is timed by wrapping the drawing methods, the game logic
+        # is timed where it is called
+        self._profiler = profiler or FrameProfiler()
+        self._profiler.instrument(
+            self._graphics_handler,
+            "render",
+            (
+                "update_main_menu",
+                "blur_screen",
+                "update_about_screen",
+                "update_game_screen",
+                "update_game_over_screen",
+            ),
+        )
 
     def start_game(self):
-        self._game_state = 1
+        """Starts a new game, or asks the game server for a seat in one when online."""
+        if self._client is not None:
+            self._seat = None
+            self._core = HeadlessGame(self._num_players)
+            self._client.join(self._online_game, self._num_players, self._spectate)
+        else:
+            self._core = HeadlessGame(self._num_players, self._recorder)
+        self._game_state = 2
+        self._dirty = True
+
+    def update_network(self) -> None:
+        """Plays the moves, or shows the board updates, that the game server sent since the last frame."""
+        if self._client is None:
+            return
+        for message in self._client.poll():
+            kind = message["type"]
+            if kind == "joined":
+                # Games that are under way are caught up by playing their moves
+                self._seat = message["seat"]
+                self._core = HeadlessGame(message["players"])
+                for _, *move in message["moves"]:
+                    self._core.apply_move(*move)
+                self._game_state = 2
+            elif kind == "move" and self._game_state == 2:
+                with self._profiler.section("logic"):
+                    self._core.apply_move(
+                        message["piece"],
+                        message["orientation"],
+                        message["row"],
+                        message["col"],
+                    )
+            elif kind in ("snapshot", "delta") and self._game_state == 2:
+                # Spectators are sent the board instead of the moves
+                if not isinstance(self._core, BoardMirror):
+                    self._core = BoardMirror()
+                self._core.apply(from_message(message))
+            elif kind == "game_over" and self._game_state == 2:
+                self._end_game(message["scores"], message["winners"])
+            elif kind == "error":
+                print(f"server: {message['message']}", file=sys.stderr)
+            self._dirty = True
+        if not self._client.connected and self._game_state == 2:
+            print("lost the connection to the server", file=sys.stderr)
+            self._client = None
+            self._game_state = 0
+            self._dirty = True
+
+    def _is_local_turn(self) -> bool:
+        """Checks if the current player is played with the mouse and keyboard here."""
+        if self.current_player in self._computer_players:
+            return False
+        return self._client is None or self.current_player == self._seat
+
+    def start_replay(self, replay: Replay) -> None:
+        """
+        Shows a recorded game instead of playing one. The arrow keys step
+        through it, Home and End go to its start and end, and Escape goes
+        back to the menu.
+        """
+        self._replay = replay
+        self._core = replay.game
+        self._game_state = 4
+        self._dirty = True
+
+    def _handle_replay_keyboard(self, event: pygame.event.Event) -> None:
+        """Steps through the replay: left and right by a move, up and down by a round."""
+        self._dirty = True
+        if event.key == pygame.K_ESCAPE:
+            # The replay's game stays behind the menu until a new game is started
+            self._replay = None
+            self._game_state = 0
+            return
+        replay = self._replay
+        if event.key == pygame.K_RIGHT:
+            replay.step(1)
+        elif event.key == pygame.K_LEFT:
+            replay.step(-1)
+        elif event.key == pygame.K_DOWN:
+            replay.step(self._num_players)
+        elif event.key == pygame.K_UP:
+            replay.step(-self._num_players)
+        elif event.key == pygame.K_HOME:
+            replay.seek(0)
+        elif event.key == pygame.K_END:
+            replay.seek(replay.num_moves)
+        self._core = replay.game
 
     @property
     def num_players(self):
         return self._num_players
 
+    @property
+    def core(self):
+        return self._core
+
     @property
     def board(self):
-        return self._board
+        return self._core.board
 
     @property
     def current_player(self):
-        return self._current_player
+        return self._core.current_player
 
     @property
     def players(self):
-        return self._players
+        return self._core.players
 
-    def _update_turn(self) -> None:
-        """Updates current_player to the ID of the next player"""
-        if self._current_player + 1 == self._num_players:
-            self._board.toggle_first_move()
-        self._current_player = (self._current_player + 1) % self._num_players
+    def pop_dirty_rects(self) -> list[pygame.Rect]:
+        """Gets the parts of the screen that were redrawn since the last call."""
+        return self._graphics_handler.pop_dirty_rects()
 
-        if not self._has_legal_moves[self._current_player]:
-            self._update_turn()
-        else:
-            if not self.can_play_move():
-                self._has_legal_moves[self.current_player] = False
-
-                if self._has_legal_moves == [False] * 4:
-                    self._game_state = 3
-
-                self._update_turn()
-
-    def _find_winner(self) -> list[int]:
-        """Finds the player(s) with the highest score."""
-        winners = []
-        max_score = -100
-
-        for i in range(4):
-            squares_left = self.players[i].squares_left
-            if squares_left > max_score:
-                winners = [i]
-            elif squares_left == max_score:
-                winners.append(i)
-
-        return winners
+    def draw_overlay(self, lines: list[str] | None) -> None:
+        """Draws debugging text over the top of the screen, or clears it if lines is None."""
+        self._graphics_handler.draw_overlay(lines)
 
     def can_play_move(self) -> bool:
         """Checks if the current player has any legal moves."""
-        player = self._players[self.current_player]
-        available_pieces = player.available_pieces
-        for piece_id in available_pieces:
-            piece = player.pieces_copy[piece_id]
-
-            # Check all rotations before the piece is flipped horizontally
-            if self._check_all_rotations(piece):
-                return True
-
-            # Check all rotations when piece is flipped horizontally
-            piece.flip_horizontally()
-            if self._check_all_rotations(piece):
-                return True
-            piece.flip_horizontally()
-
-            # Check all rotations when piece is flipped vertically
-            piece.flip_vertically()
-            if self._check_all_rotations(piece):
-                return True
-            piece.flip_vertically()
-
-        return False
-
-    def _check_all_rotations(self, piece: Piece) -> bool:
-        for i in range(4):
-            piece.rotate_clockwise()
-            if self._board.can_place_piece(piece, self.current_player):
-                return True
-        return False
+        return self._core.can_play_move()
+
+    def update_computer_player(self) -> None:
+        """Lets a computer player take its turn, if it is one's turn."""
+        if self._game_state != 2 or self.current_player not in self._computer_players:
+            return
+        policy = self._computer_players[self.current_player]
+        with self._profiler.section("computer"):
+            move = policy(self._core, self._rng)
+        with self._profiler.section("logic"):
+            self._core.apply_move(*move)
+        if self._core.game_over:
+            self._end_game()
+        self._dirty = True
+
+    def _end_game(
+        self, scores: list[int] | None = None, winners: list[int] | None = None
+    ) -> None:
+        """Switches to the game over screen, with the scores of the game unless others are given."""
+        if scores is None:
+            scores, winners = self._core.scores(), self._core.winners()
+        self._result = (scores, winners)
+        self._game_state = 3
+        if self._recorder is not None:
+            self._recorder.end_game()
+        self._dirty = True
+
+    def _hover_target(self):
+        """Finds what the mouse is over: a button on the menus or a square in game."""
+        x, y = self._mouse_pos
+        if self._game_state == 0:
+            if 520 <= x <= 880 and 390 <= y <= 510:
+                return "start"
+            if 520 <= x <= 880 and 540 <= y <= 660:
+                return "rules"
+            return None
+        if self._game_state == 1:
+            return 520 <= x <= 880 and 495 <= y <= 615
+        if self._game_state == 4:
+            return None
+        if self._game_state == 2:
+            return tuple(self._graphics_handler.get_square_from_coords(self._mouse_pos))
+        return 520 <= x <= 880 and 540 <= y <= 660
+
+    def handle_mouse_motion(self, coords: tuple) -> None:
+        """Moves the mouse, only asking for a redraw if it moved onto something else."""
+        self._mouse_pos = coords
+        if self._hover_target() != self._drawn_hover:
+            self._dirty = True
 
     def handle_mouse(self, event: pygame.event.Event, coords: tuple) -> None:
+        """Handles a mouse click. The screen is only redrawn by the next update."""
+        self._mouse_pos = coords
+        self._dirty = True
+        if event.type != pygame.MOUSEBUTTONDOWN or event.button != 1:
+            return
+        target = self._hover_target()
+
         if self._game_state == 0:
-            # Updates the main menu based on where the mouse is hovering
-            if 520 <= coords[0] <= 880 and 390 <= coords[1] <= 510:
-                self._graphics_handler.update_main_menu(True, False)
-            elif 520 <= coords[0] <= 880 and 540 <= coords[1] <= 660:
-                self._graphics_handler.update_main_menu(False, True)
-            else:
-                self._graphics_handler.update_main_menu(False, False)
-
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                if 520 <= coords[0] <= 880 and 390 <= coords[1] <= 510:
-                    self._game_state = 2
-                    self._update_turn()
-                elif 520 <= coords[0] <= 880 and 540 <= coords[1] <= 660:
-                    self._game_state = 1
-                    self._graphics_handler.blur_screen()
+            if target == "start":
+                self.start_game()
+            elif target == "rules":
+                self._game_state = 1
+                self._graphics_handler.blur_screen()
 
         elif self._game_state == 1:
-            if 520 <= coords[0] <= 880 and 495 <= coords[1] <= 615:
-                self._graphics_handler.update_about_screen(True)
-            else:
-                self._graphics_handler.update_about_screen(False)
-
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                if 520 <= coords[0] <= 880 and 495 <= coords[1] <= 615:
-                    self._game_state = 0
+            if target:
+                self._game_state = 0
 
         elif self._game_state == 2:  # In game
-            # Convert the coordinates into the square that the mouse is hovering over
-            square = self._graphics_handler.get_square_from_coords(coords)
-
-            # No pieces left or no legal moves? Skip the turn
-            player = self._players[self._current_player]
-            piece = player.get_piece()
-
-            # Places a piece on left click
-            if (
-                event.type == pygame.MOUSEBUTTONDOWN
-                and event.button == 1
-                and -1 not in square
-            ):
-                if self._board.place_piece(
-                    piece, square[0], square[1], self._current_player
-                ):
-                    player.use_piece()
-                    self._update_turn()
-
-            # Update the shadow board and screen
-            self._board.update_shadow(piece, square[0], square[1], self._current_player)
-            self._graphics_handler.update_game_screen(
-                self._board, self.current_player, self.players
-            )
+            # Places a piece on left click, players without legal moves are skipped by the core
+            if -1 not in target and self._is_local_turn():
+                piece = self.players[self.current_player].get_piece()
+                orientation = piece.table_orientation
+                if self._client is not None:
+                    # The server plays the move and sends it back
+                    if orientation is not None and self._core.is_move_legal(
+                        orientation.piece_id, orientation.index, target[0], target[1]
+                    ):
+                        self._client.send_move(
+                            orientation.piece_id, orientation.index, *target
+                        )
+                    return
+                with self._profiler.section("logic"):
+                    applied = orientation is not None and self._core.apply_move(
+                        orientation.piece_id, orientation.index, target[0], target[1]
+                    )
+                if applied and self._core.game_over:
+                    self._end_game()
 
         elif self._game_state == 3:  # Finished game
-            scores = []
-            max_score = -100
-            for i in range(4):
-                player = self.players[i]
-
-                # Score calculation
-                score = -player.squares_left
-                if len(player.available_pieces) == 0:
-                    score += 15
-                    if player.last_piece_played == 1:
-                        score += 5
-
-                # Winner calculation
-                scores.append(score)
-                if score > max_score:
-                    max_score = score
-                    winners = [i]
-                elif score == max_score:
-                    winners.append(i)
-
-            if 520 <= coords[0] <= 880 and 540 <= coords[1] <= 660:
-                self._graphics_handler.update_game_over_screen(True, scores, winners)
-            else:
-                self._graphics_handler.update_game_over_screen(False, scores, winners)
-
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                if 520 <= coords[0] <= 880 and 540 <= coords[1] <= 660:
-                    self._game_state = 0
-                    self._update_turn()
+            if target:
+                self._game_state = 0
 
     def handle_keyboard(self, event: pygame.event.Event) -> None:
-        player = self._players[self._current_player]
-        piece = player.get_piece()
+        """Handles a key press. The screen is only redrawn by the next update."""
+        if self._game_state == 4:
+            self._handle_replay_keyboard(event)
+            return
+        if self._client is not None and not self._is_local_turn():
+            return
+        player = self.players[self.current_player]
         if event.key == pygame.K_x:
-            piece.rotate_clockwise()
+            player.rotate_clockwise()
         elif event.key == pygame.K_z:
-            piece.rotate_counterclockwise()
+            player.rotate_counterclockwise()
         elif event.key == pygame.K_a:
-            piece.flip_vertically()
+            player.flip_vertically()
         elif event.key == pygame.K_s:
-            piece.flip_horizontally()
+            player.flip_horizontally()
         elif event.key == pygame.K_LEFT:
             player.left_piece()
         elif event.key == pygame.K_RIGHT:
@@ -205,8 +302,58 @@ class Game:
             player.down_piece()
         elif event.key == pygame.K_UP:
             player.up_piece()
+        elif (
+            event.key == pygame.K_BACKSPACE
+            and self._game_state == 2
+            and self._client is None
+        ):
+            # Take back moves until it is a human player's turn again
+            with self._profiler.section("logic"):
+                while (
+                    self._core.undo_move()
+                    and self.current_player in self._computer_players
+                ):
+                    pass
+        self._dirty = True
+
+    def update(self) -> None:
+        """
+        Brings the screen up to date with the input handled since the last
+        update. Does nothing if nothing changed.
+        """
+        if not self._dirty:
+            return
+        self._dirty = False
+        target = self._hover_target()
+        self._drawn_hover = target
 
-        if self._game_state == 1:
+        if self._game_state == 0:
+            self._graphics_handler.update_main_menu(
+                target == "start", target == "rules"
+            )
+
+        elif self._game_state == 1:
+            self._graphics_handler.update_about_screen(target)
+
+        elif self._game_state == 2:
+            # Only players at this screen get a shadow under the mouse
+            with self._profiler.section("logic"):
+                if not self._is_local_turn():
+                    self.board.clear_shadow()
+                else:
+                    piece = self.players[self.current_player].get_piece()
+                    self.board.update_shadow(
+                        piece, target[0], target[1], self.current_player
+                    )
             self._graphics_handler.update_game_screen(
-                self._board, self.current_player, self.players
+                self.board, self.current_player, self.players
             )
+
+        elif self._game_state == 4:
+            # The board is drawn just like in game, without a shadow
+            self._graphics_handler.update_game_screen(
+                self.board, self.current_player, self.players
+            )
+
+        elif self._game_state == 3:
+            self._graphics_handler.update_game_over_screen(target, *self._result)
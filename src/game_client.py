@@ -0,0 +1,91 @@
+import json
+import queue
+import socket
+import threading
+
+
+def parse_address(address: str) -> tuple[str, int] | str:
+    """Parses a server address: host:port for TCP, anything else is a Unix socket path."""
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit():
+        return host or "localhost", int(port)
+    return address
+
+
+class GameClient:
+    """
+    A blocking connection to a game server for the pygame front end. A
+    background thread reads the server's messages into a queue, so the
+    frame loop only has to poll it.
+    """
+
+    def __init__(self, address: str):
+        target = parse_address(address)
+        if isinstance(target, str):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(target)
+        else:
+            self._socket = socket.create_connection(target)
+        self._messages: queue.SimpleQueue[dict | None] = queue.SimpleQueue()
+        self._connected = True
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    @property
+    def connected(self):
+        return self._connected
+
+    def send(self, message: dict) -> None:
+        try:
+            self._socket.sendall(json.dumps(message).encode() + b"\n")
+        except OSError:
+            self._connected = False
+
+    def join(self, game: str, num_players: int = 4, spectate: bool = False) -> None:
+        """Asks for a seat in a game, or to watch it. The server answers with "joined"."""
+        if spectate:
+            self.send({"type": "spectate", "game": game})
+        else:
+            self.send({"type": "join", "game": game, "players": num_players})
+
+    def send_move(self, piece_id: int, orientation: int, row: int, col: int) -> None:
+        self.send(
+            {
+                "type": "move",
+                "piece": piece_id,
+                "orientation": orientation,
+                "row": row,
+                "col": col,
+            }
+        )
+
+    def poll(self) -> list[dict]:
+        """Gets the messages that arrived since the last poll, without waiting."""
+        messages = []
+        while True:
+            try:
+                message = self._messages.get_nowait()
+            except queue.Empty:
+                return messages
+            if message is None:
+                self._connected = False
+            else:
+                messages.append(message)
+
+    def close(self) -> None:
+        self._connected = False
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+    def _read(self) -> None:
+        # None tells poll that the server went away
+        try:
+            with self._socket.makefile("rb") as lines:
+                for line in lines:
+                    self._messages.put(json.loads(line))
+        except (OSError, ValueError):
+            pass
+        self._messages.put(None)
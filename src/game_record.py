@@ -0,0 +1,276 @@
+import mmap
+import os
+import struct
+from collections.abc import Iterator
+from typing import BinaryIO, NamedTuple
+from game_board import pack_move, unpack_move
+from headless_game import HeadlessGame
+
+# A record file is a sequence of games. Every game is a header followed by
+# its moves and an end marker:
+#
+#   header  magic b"BLKR", version, ruleset, number of players, seed
+#   move    3 bytes, little endian: player << 18 | pack_move(piece, orientation, row, col)
+#   undo    3 zero bytes, which takes back the move before it
+#   end     3 0xFF bytes
+#
+# Version 1 only has the classic ruleset (0): a 20x20 board with a start
+# corner per player. A seed of -1 means the game didn't have one.
+MAGIC = b"BLKR"
+VERSION = 1
+CLASSIC_RULES = 0
+
+_HEADER = struct.Struct("<4sBBBq")
+_MOVE_SIZE = 3
+_UNDO = 0
+_END = 0xFFFFFF
+_END_BYTES = _END.to_bytes(_MOVE_SIZE, "little")
+
+
+class RecordError(ValueError):
+    """Raised when a record file is malformed or uses an unsupported version."""
+
+
+class GameRecord(NamedTuple):
+    """A game read from a record file. Undone moves are left out of the moves."""
+
+    version: int
+    ruleset: int
+    num_players: int
+    seed: int | None
+    # (player, piece_id, orientation, row, col) of every move that wasn't taken back
+    moves: list[tuple[int, int, int, int, int]]
+    finished: bool  # False if the file ended before the game's end marker
+
+
+def encode_move(
+    player_id: int, piece_id: int, orientation: int, row: int, col: int
+) -> bytes:
+    """Encodes a move into the 3 bytes it takes up in a record."""
+    return (player_id << 18 | pack_move(piece_id, orientation, row, col)).to_bytes(
+        _MOVE_SIZE, "little"
+    )
+
+
+def decode_move(code: int) -> tuple[int, int, int, int, int]:
+    """Decodes a move code into (player, piece_id, orientation, row, col)."""
+    return (code >> 18 & 3, *unpack_move(code))
+
+
+class GameRecordWriter:
+    """
+    Streams games to a binary record file. Moves are collected in a buffer
+    that is only written out once it is full, so recording a move is just
+    appending 3 bytes.
+    """
+
+    def __init__(self, file: BinaryIO, buffer_size: int = 1 << 16):
+        self._file = file
+        self._buffer = bytearray()
+        self._buffer_size = buffer_size
+        self._in_game = False
+        self._games = 0
+
+    @property
+    def games(self):
+        return self._games
+
+    def __enter__(self) -> "GameRecordWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def begin_game(
+        self, num_players: int, seed: int | None = None, ruleset: int = CLASSIC_RULES
+    ) -> None:
+        """Starts a new game, ending the previous one if it wasn't ended."""
+        if self._in_game:
+            self.end_game()
+        self._buffer += _HEADER.pack(
+            MAGIC, VERSION, ruleset, num_players, -1 if seed is None else seed
+        )
+        self._in_game = True
+
+    def write_move(
+        self, player_id: int, piece_id: int, orientation: int, row: int, col: int
+    ) -> None:
+        """Records a move of the current game."""
+        self._buffer += encode_move(player_id, piece_id, orientation, row, col)
+        self._flush_if_full()
+
+    def write_undo(self) -> None:
+        """Records that the last move of the current game was taken back."""
+        self._buffer += _UNDO.to_bytes(_MOVE_SIZE, "little")
+        self._flush_if_full()
+
+    def end_game(self) -> None:
+        """Ends the current game."""
+        if not self._in_game:
+            return
+        self._buffer += _END_BYTES
+        self._in_game = False
+        self._games += 1
+        self._flush_if_full()
+
+    def write_game(
+        self,
+        num_players: int,
+        moves: list[tuple[int, int, int, int, int]],
+        seed: int | None = None,
+        ruleset: int = CLASSIC_RULES,
+    ) -> None:
+        """Records a whole game from its (player, piece_id, orientation, row, col) moves."""
+        self.begin_game(num_players, seed, ruleset)
+        for move in moves:
+            self._buffer += encode_move(*move)
+        self.end_game()
+
+    def flush(self) -> None:
+        """Writes out everything that is buffered."""
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+        self._file.flush()
+
+    def close(self) -> None:
+        """Ends the current game and writes out the buffer. Doesn't close the file."""
+        self.end_game()
+        self.flush()
+
+    def _flush_if_full(self) -> None:
+        if len(self._buffer) >= self._buffer_size:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+
+
+def read_games(file: BinaryIO, chunk_size: int = 1 << 16) -> Iterator[GameRecord]:
+    """Lazily reads every game of a record file, reading it a chunk at a time."""
+    data = bytearray()
+    position = 0
+    eof = False
+    while True:
+        parsed = _parse_game(data, position, eof) if position < len(data) else None
+        if parsed is not None:
+            record, position = parsed
+            yield record
+        elif eof:
+            return
+        else:
+            # The next game isn't all there yet
+            del data[:position]
+            position = 0
+            chunk = file.read(chunk_size)
+            data += chunk
+            eof = not chunk
+
+
+def map_games(path: str) -> Iterator[GameRecord]:
+    """
+    Lazily reads every game of a record file through a memory map, so only
+    the parts of the file being read have to be in memory.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = 0
+            while position < len(data):
+                record, position = _parse_game(data, position, True)
+                yield record
+
+
+def _parse_game(data, position: int, eof: bool) -> tuple[GameRecord, int] | None:
+    """
+    Parses the game that starts at a position of a buffer, returning it and
+    the position after it. Returns None if the buffer doesn't hold all of
+    the game but more of the file can still be read.
+    """
+    if len(data) - position < _HEADER.size:
+        if eof:
+            raise RecordError("file ends in the middle of a game header")
+        return None
+    magic, version, ruleset, num_players, seed = _HEADER.unpack_from(data, position)
+    if magic != MAGIC:
+        raise RecordError(f"bad magic {magic!r}, not a game record")
+    if version != VERSION:
+        raise RecordError(f"unsupported record version {version}")
+    if ruleset != CLASSIC_RULES:
+        raise RecordError(f"unsupported ruleset {ruleset}")
+    position += _HEADER.size
+    header = (version, ruleset, num_players, seed)
+
+    # No byte of a move can be 0xff, as pieces, rows and columns are below
+    # 31, so the game's moves run up to the first 0xff byte
+    end = data.find(_END_BYTES, position)
+    finished = end != -1
+    if not finished:
+        if not eof:
+            return None
+        end = len(data)
+    block = bytes(data[position:end])
+
+    codes = [
+        block[i] | block[i + 1] << 8 | block[i + 2] << 16
+        for i in range(0, len(block) - _MOVE_SIZE + 1, _MOVE_SIZE)
+    ]
+    # A game whose end marker was never written, because the writer was
+    # killed, runs on into the next game, whose header can hold 0xff bytes
+    # in its seed. Move codes never have a bit above 19 set, but every
+    # alignment of MAGIC puts one of its bytes there, so the first such
+    # code is where the cut off game stops.
+    if codes and max(codes) >> 20:
+        bad = next(i for i, code in enumerate(codes) if code >> 20)
+        next_game = data.find(MAGIC, position + bad * _MOVE_SIZE)
+        if next_game == -1:
+            if not eof:
+                return None
+            raise RecordError(f"bad move code {codes[bad]:06x}")
+        return _make_record(header, codes[:bad], False), next_game
+    if len(block) % _MOVE_SIZE:
+        raise RecordError("file ends in the middle of a move")
+    record = _make_record(header, codes, finished)
+    return record, end + _MOVE_SIZE if finished else end
+
+
+def _make_record(header: tuple, codes: list[int], finished: bool) -> GameRecord:
+    version, ruleset, num_players, seed = header
+    if _UNDO in codes:
+        codes = _apply_undos(codes)
+    moves = [
+        (code >> 18 & 3, code & 31, code >> 5 & 7, code >> 8 & 31, code >> 13 & 31)
+        for code in codes
+    ]
+    return GameRecord(
+        version, ruleset, num_players, None if seed == -1 else seed, moves, finished
+    )
+
+
+def _apply_undos(codes: list[int]) -> list[int]:
+    """Drops the undo codes of a game along with the moves they took back."""
+    moves = []
+    for code in codes:
+        if code != _UNDO:
+            moves.append(code)
+        elif moves:
+            moves.pop()
+        else:
+            raise RecordError("undo without a move to take back")
+    return moves
+
+
+def replay(record: GameRecord) -> HeadlessGame:
+    """
+    Rebuilds the board and players of a recorded game by playing its moves,
+    raising RecordError if a move is illegal or played by the wrong player.
+    """
+    game = HeadlessGame(record.num_players)
+    for number, (player_id, *move) in enumerate(record.moves):
+        if player_id != game.current_player:
+            raise RecordError(
+                f"move {number} was played by player {player_id}, "
+                f"but it is player {game.current_player}'s turn"
+            )
+        if not game.apply_move(*move):
+            raise RecordError(f"move {number} {tuple(move)} is illegal")
+    return game
@@ -0,0 +1,497 @@
+"""
+Hosts many games of Blokus at once over TCP or a Unix socket, with every
+connection and game on a single asyncio event loop.
+
+Example: python src/game_server.py --port 7777
+         python src/main.py --connect localhost:7777 --online-game lobby
+
+Clients and the server send each other one JSON object per line, with its
+kind in "type".
+
+Client messages:
+  join       {"type": "join", "game": name, "players": 4}
+             Takes a free seat in a game, which is made if it doesn't exist
+             and starts once every seat is taken. "players" only matters
+             for a new game.
+  spectate   {"type": "spectate", "game": name}
+  move       {"type": "move", "piece": id, "orientation": i, "row": r, "col": c}
+
+Server messages:
+  joined     {"type": "joined", "game": name, "seat": seat or null, "players": n,
+              "started": bool, "moves": [[player, piece, orientation, row, col], ...]}
+             The answer to join and spectate. Only players get the moves so far.
+  start      {"type": "start"}
+  move       {"type": "move", "player": p, "piece": id, "orientation": i,
+              "row": r, "col": c, "next": player to move, -1 once the game is over}
+             Only sent to players.
+  snapshot   {"type": "snapshot", "sequence": n, "width": w, "height": h,
+              "cells": [owner, ...], "remaining": [pieces, ...], "turn": p}
+  delta      {"type": "delta", "sequence": n, "cells": [[square, owner], ...],
+              "pieces": [[player, piece, used], ...], "turn": p or null}
+             Spectators get the board as a snapshot and then a delta for
+             every move, see board_feed.py. Spectators that can't keep up
+             skip to the next snapshot instead of being dropped.
+  timeout    {"type": "timeout", "player": p}
+             The player didn't move in time, so the server moves for them.
+  game_over  {"type": "game_over", "scores": [...], "winners": [...]}
+  error      {"type": "error", "message": text}
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from concurrent.futures import Executor, ThreadPoolExecutor
+from board_feed import Subscription, to_message
+from game_record import GameRecordWriter
+from headless_game import HeadlessGame
+from policies import random_policy
+
+# Clients that don't read their messages are dropped once this much is waiting to be sent
+MAX_WRITE_BUFFER = 1 << 20
+# Spectators aren't sent any more updates while this much is waiting to be sent
+SPECTATOR_WRITE_BUFFER = 1 << 14
+# Updates kept for a spectator before it has to wait for the next snapshot
+SPECTATOR_QUEUE = 32
+MAX_LINE = 1 << 12
+# Hundreds of games can start at once, each with a connection per seat
+BACKLOG = 1024
+
+
+class Connection:
+    """A client connection, seated in or watching at most one game at a time."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self._writer = writer
+        self.room: "Room | None" = None
+        self.seat: int | None = None
+        # The board updates of the game a spectator is watching
+        self.subscription: Subscription | None = None
+
+    @property
+    def closed(self):
+        return self._writer.is_closing()
+
+    @property
+    def buffered(self) -> int:
+        """The number of bytes waiting to be sent."""
+        return self._writer.transport.get_write_buffer_size()
+
+    def send(self, line: bytes) -> None:
+        """Queues an encoded message, dropping the client if it has fallen too far behind."""
+        if self._writer.is_closing():
+            return
+        if self._writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self._writer.close()
+            return
+        self._writer.write(line)
+
+    def send_message(self, message: dict) -> None:
+        self.send(_encode(message))
+
+    def error(self, message: str) -> None:
+        self.send_message({"type": "error", "message": message})
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+class Room:
+    """
+    A game on the server with its seated players and spectators. Only the
+    player whose turn it is may move, and the server plays a random move
+    for them if they take longer than move_timeout seconds.
+    """
+
+    def __init__(self, server: "GameServer", name: str, num_players: int):
+        self._server = server
+        self._name = name
+        self._game = HeadlessGame(num_players)
+        self._feed = self._game.start_feed()
+        self._seats: list[Connection | None] = [None] * num_players
+        self._spectators: set[Connection] = set()
+        self._moves: list[tuple[int, int, int, int, int]] = []
+        self._started = False
+        self._closed = False
+        # Moves are played one at a time, and nobody joins in the middle of one
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.TimerHandle | None = None
+        self._rng = random.Random()
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def game(self):
+        return self._game
+
+    @property
+    def started(self):
+        return self._started
+
+    @property
+    def moves(self):
+        return self._moves
+
+    @property
+    def empty(self):
+        """Whether every seat was left and nobody is watching."""
+        return not self._spectators and all(seat is None for seat in self._seats)
+
+    async def join(self, connection: Connection, spectate: bool) -> str | None:
+        """Seats a client, or lets it watch. Returns why it can't join, if it can't."""
+        async with self._lock:
+            if self._closed:
+                return f"game {self._name!r} just ended, join again for a new one"
+            if spectate:
+                self._spectators.add(connection)
+                connection.subscription = self._feed.subscribe(SPECTATOR_QUEUE)
+                seat = None
+            elif None in self._seats:
+                seat = self._seats.index(None)
+                self._seats[seat] = connection
+            else:
+                return f"game {self._name!r} is full"
+            connection.room = self
+            connection.seat = seat
+            connection.send_message(
+                {
+                    "type": "joined",
+                    "game": self._name,
+                    "seat": seat,
+                    "players": self._game.num_players,
+                    "started": self._started,
+                    "moves": [] if spectate else self._moves,
+                }
+            )
+            if spectate:
+                self._send_updates()
+            if not self._started and None not in self._seats:
+                self._started = True
+                self._broadcast({"type": "start"})
+                self._start_timer()
+            return None
+
+    def leave(self, connection: Connection) -> None:
+        """
+        Takes a client out of the game. Its seat stays empty, so its turns
+        time out, and a game that hasn't started can take someone else.
+        """
+        self._spectators.discard(connection)
+        if connection.subscription is not None:
+            connection.subscription.close()
+            connection.subscription = None
+        if connection.seat is not None and self._seats[connection.seat] is connection:
+            self._seats[connection.seat] = None
+        connection.room = None
+        connection.seat = None
+        if self.empty:
+            self._close()
+
+    async def play(
+        self,
+        connection: Connection,
+        piece_id: int,
+        orientation: int,
+        row: int,
+        col: int,
+    ) -> None:
+        """Plays a move of a seated client, or tells it why it can't be played."""
+        async with self._lock:
+            game = self._game
+            if not self._started:
+                connection.error("the game hasn't started")
+            elif game.game_over:
+                connection.error("the game is over")
+            elif connection.seat != game.current_player:
+                connection.error("it isn't your turn")
+            # Checking a single placement is cheap enough for the event loop
+            elif not game.is_move_legal(piece_id, orientation, row, col):
+                connection.error("illegal move")
+            else:
+                self._apply_move(piece_id, orientation, row, col)
+
+    def _apply_move(self, piece_id: int, orientation: int, row: int, col: int) -> None:
+        """Plays a legal move and tells everyone. Only called with the lock held."""
+        self._cancel_timer()
+        player_id = self._game.current_player
+        # Passing the turn on checks if the next players can move, which is
+        # cheap with the moves HeadlessGame remembers (under a millisecond
+        # at worst), so it costs less than handing it to the executor
+        self._game.apply_move(piece_id, orientation, row, col)
+        self._moves.append((player_id, piece_id, orientation, row, col))
+        game = self._game
+        self._broadcast(
+            {
+                "type": "move",
+                "player": player_id,
+                "piece": piece_id,
+                "orientation": orientation,
+                "row": row,
+                "col": col,
+                "next": -1 if game.game_over else game.current_player,
+            },
+            spectators=False,
+        )
+        self._send_updates()
+        if game.game_over:
+            self._broadcast(
+                {
+                    "type": "game_over",
+                    "scores": game.scores(),
+                    "winners": game.winners(),
+                }
+            )
+            self._server.game_over(self)
+            self._close()
+        else:
+            self._start_timer()
+
+    def _start_timer(self) -> None:
+        timeout = self._server.move_timeout
+        if timeout and not self._closed:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(timeout, self._on_timeout)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timeout(self) -> None:
+        self._timer = None
+        self._server.spawn(self._play_for_current_player())
+
+    async def _play_for_current_player(self) -> None:
+        async with self._lock:
+            # A move may have come in while this was waiting for the lock
+            if self._timer is not None or self._closed:
+                return
+            self._broadcast({"type": "timeout", "player": self._game.current_player})
+            # Going through every legal move can take several milliseconds
+            move = await self._server.run(random_policy, self._game, self._rng)
+            self._apply_move(*move)
+
+    def _broadcast(self, message: dict, spectators: bool = True) -> None:
+        # Every client gets the same bytes, so the message is only encoded once
+        line = _encode(message)
+        for connection in self._seats:
+            if connection is not None:
+                connection.send(line)
+        if spectators:
+            for connection in self._spectators:
+                connection.send(line)
+
+    def _send_updates(self) -> None:
+        """
+        Sends the spectators the board updates they haven't had. The updates
+        of spectators that are still sending earlier ones are left in their
+        queues, which drop them for the next snapshot once they are full.
+        """
+        # Most spectators get the same updates, so each is only encoded once
+        lines: dict[int, tuple] = {}
+        for connection in self._spectators:
+            if connection.buffered > SPECTATOR_WRITE_BUFFER:
+                continue
+            for update in connection.subscription.poll():
+                if id(update) not in lines:
+                    lines[id(update)] = (update, _encode(to_message(update)))
+                connection.send(lines[id(update)][1])
+
+    def _close(self) -> None:
+        """Stops the game's timer and lets the server forget it."""
+        self._closed = True
+        self._cancel_timer()
+        self._server.remove_room(self)
+
+
+class GameServer:
+    """
+    Hosts the games and their connections. The rules run on the event loop
+    when they are cheap, and searches for moves run in an executor.
+    """
+
+    def __init__(
+        self,
+        move_timeout: float | None = 60,
+        executor: Executor | None = None,
+        recorder: GameRecordWriter | None = None,
+    ):
+        self._move_timeout = move_timeout
+        self._executor = executor
+        self._recorder = recorder
+        self._rooms: dict[str, Room] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._games_finished = 0
+        self._moves_played = 0
+
+    @property
+    def move_timeout(self):
+        return self._move_timeout
+
+    @property
+    def rooms(self):
+        return self._rooms
+
+    @property
+    def games_finished(self):
+        return self._games_finished
+
+    @property
+    def moves_played(self):
+        return self._moves_played
+
+    async def run(self, function, *args):
+        """Calls a function in the executor, without blocking the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, function, *args
+        )
+
+    def spawn(self, coroutine) -> None:
+        """Runs a coroutine in the background, keeping a reference so it isn't collected."""
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def remove_room(self, room: Room) -> None:
+        if self._rooms.get(room.name) is room:
+            del self._rooms[room.name]
+
+    def game_over(self, room: Room) -> None:
+        """Counts and records a finished game."""
+        self._games_finished += 1
+        self._moves_played += len(room.moves)
+        if self._recorder is not None:
+            self._recorder.write_game(room.game.num_players, room.moves)
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Reads the messages of a client until it disconnects."""
+        connection = Connection(writer)
+        try:
+            while not connection.closed:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    # Reset, or a line longer than MAX_LINE
+                    break
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError
+                except ValueError:
+                    connection.error("messages have to be JSON objects")
+                    continue
+                await self._handle_message(connection, message)
+        finally:
+            if connection.room is not None:
+                connection.room.leave(connection)
+            connection.close()
+
+    async def _handle_message(self, connection: Connection, message: dict) -> None:
+        kind = message.get("type")
+        if kind in ("join", "spectate"):
+            if connection.room is not None:
+                connection.room.leave(connection)
+            name = message.get("game")
+            num_players = message.get("players", 4)
+            if not isinstance(name, str) or num_players not in (2, 3, 4):
+                connection.error("join needs a game name and 2 to 4 players")
+                return
+            room = self._rooms.get(name)
+            if room is None:
+                room = self._rooms[name] = Room(self, name, num_players)
+            error = await room.join(connection, kind == "spectate")
+            if error is not None:
+                connection.error(error)
+        elif kind == "move":
+            move = [message.get(key) for key in ("piece", "orientation", "row", "col")]
+            if connection.room is None or connection.seat is None:
+                connection.error("you aren't playing a game")
+            elif not all(type(value) is int for value in move):
+                connection.error("a move needs integer piece, orientation, row and col")
+            elif not 1 <= move[0] <= 21 or move[2] < 0 or move[3] < 0:
+                connection.error("illegal move")
+            else:
+                await connection.room.play(connection, *move)
+        else:
+            connection.error(f"unknown message type {kind!r}")
+
+    async def serve(
+        self,
+        host: str | None = None,
+        port: int | None = None,
+        path: str | None = None,
+    ) -> asyncio.AbstractServer:
+        """Starts listening on a Unix socket if path is given, otherwise on TCP."""
+        if path is not None:
+            return await asyncio.start_unix_server(
+                self.handle_connection, path, limit=MAX_LINE, backlog=BACKLOG
+            )
+        return await asyncio.start_server(
+            self.handle_connection, host, port, limit=MAX_LINE, backlog=BACKLOG
+        )
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+async def _main(args: argparse.Namespace) -> None:
+    record_file = open(args.record, "ab") if args.record else None
+    recorder = GameRecordWriter(record_file) if record_file else None
+    executor = ThreadPoolExecutor(args.workers) if args.workers else None
+    server = GameServer(args.move_timeout or None, executor, recorder)
+    listener = await server.serve(args.host, args.port, args.unix)
+    print(
+        f"listening on {args.unix or f'{args.host}:{args.port}'}",
+        file=sys.stderr,
+        flush=True,
+    )
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if recorder is not None:
+            recorder.close()
+            record_file.close()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket")
+    parser.add_argument(
+        "--move-timeout",
+        type=float,
+        default=60,
+        help="seconds a player has for a move before a random one is played, 0 for none",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="threads that pick the moves of players who time out, "
+        "0 for the default executor",
+    )
+    parser.add_argument(
+        "--record", metavar="PATH", help="append the finished games to a record file"
+    )
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,34 @@
 import pygame
+from collections import OrderedDict
 from game_board import GameBoard
+from orientations import PIECE_SHAPES
 from player import Player
 
 
+class _LRUCache:
+    """A dictionary that holds at most max_size items, evicting the least recently used one."""
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """Gets an item and marks it as recently used, or returns None if it isn't cached."""
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+        return item
+
+    def put(self, key, item) -> None:
+        self._items[key] = item
+        self._items.move_to_end(key)
+        if len(self._items) > self._max_size:
+            self._items.popitem(last=False)
+
+
 class GraphicsHandler:
     """Handles the graphical aspects of the game, such as drawing and updating the board and pieces."""
 
@@ -17,6 +43,14 @@ class GraphicsHandler:
         self._PLAYER_GRID_HEIGHT = 65
         self._PLAYER_GRID_WIDTH = 80
         self._PLAYER_GRID_BOX_SIZE = 15
+        self._FONT = "Fira Code"
+        # The strip above the board that none of the screens draw on
+        self._OVERLAY_RECT = pygame.Rect(440, 4, 526, 60)
+        self._TITLE_FONT = "./FiraCode-SemiBold.ttf"
+
+        # Fonts are keyed by (face, size) and rendered text by (text, face, size, color)
+        self._fonts = _LRUCache(16)
+        self._text_surfaces = _LRUCache(256)
 
         self._screen.fill(self._BG_COLOR)
         pygame.display.set_caption("Blokus")
@@ -45,15 +79,98 @@ class GraphicsHandler:
 
         self._player_grid_margins = [(984, 30), (984, 394), (15, 394), (15, 30)]
 
+        # Every piece is drawn once per player color, and a player's whole grid is
+        # cached as one surface that is only rebuilt when their pieces change
+        self._piece_sprites = [
+            [None]
+            + [
+                self._draw_piece_sprite(piece_id, self._player_colors[player_id])
+                for piece_id in range(1, 22)
+            ]
+            for player_id in range(4)
+        ]
+        self._trays = [
+            pygame.Surface(
+                (self._piece_coordinates_x[-1] + 1, self._piece_coordinates_y[-1] + 1)
+            )
+            for _ in range(4)
+        ]
+        self._tray_pieces = [None] * 4
+
+        # Parts of the screen that changed since the last display update
+        self._dirty_rects: list[pygame.Rect] = []
+
+        # What is currently drawn on the game screen, so that only changes get redrawn
+        self._game_screen_drawn = False
+        self._drawn_board_state = (None, None)
+        self._drawn_cells = [[None] * 20 for _ in range(20)]
+        self._drawn_turn = None
+        self._drawn_trays = [None] * 4
+        self._drawn_highlights = [None] * 4
+        self._drawn_scores = [None] * 4
+
+    def _get_font(self, face: str, size: int) -> pygame.font.Font:
+        """Gets a font, loading it from a file if the face is a .ttf path."""
+        font = self._fonts.get((face, size))
+        if font is None:
+            if face.endswith(".ttf"):
+                font = pygame.font.Font(face, size)
+            else:
+                font = pygame.font.SysFont(face, size)
+            self._fonts.put((face, size), font)
+        return font
+
+    def _render_text(
+        self, text: str, size: int, color=(0, 0, 0), face: str | None = None
+    ) -> pygame.Surface:
+        """Renders text, reusing the surface if the same text was rendered before."""
+        face = face or self._FONT
+        key = (text, face, size, color)
+        text_surface = self._text_surfaces.get(key)
+        if text_surface is None:
+            text_surface = self._get_font(face, size).render(text, False, color)
+            self._text_surfaces.put(key, text_surface)
+        return text_surface
+
+    def pop_dirty_rects(self) -> list[pygame.Rect]:
+        """Gets the parts of the screen that changed since the last call."""
+        dirty_rects = self._dirty_rects
+        self._dirty_rects = []
+        return dirty_rects
+
+    def invalidate_screen(self) -> None:
+        """Marks the whole screen as changed, so the game screen has to be drawn from scratch."""
+        self._dirty_rects = [self._screen.get_rect()]
+        self._game_screen_drawn = False
+
+    def draw_overlay(self, lines: list[str] | None) -> None:
+        """
+        Draws lines of text in two columns over the empty strip at the top of
+        the screen, or clears the strip if lines is None.
+        """
+        rect = pygame.draw.rect(self._screen, self._BG_COLOR, self._OVERLAY_RECT)
+        if lines:
+            font = self._get_font(self._FONT, 12)
+            rows = (len(lines) + 1) // 2
+            for i, line in enumerate(lines):
+                # Rendered directly, the numbers change too often for the text cache
+                self._screen.blit(
+                    font.render(line, False, (0, 0, 0)),
+                    (
+                        rect.x + 4 + rect.width // 2 * (i // rows),
+                        rect.y + 2 + 14 * (i % rows),
+                    ),
+                )
+        self._dirty_rects.append(rect)
+
     def update_main_menu(self, play_button: bool, rules_button: bool) -> None:
         # Fill in screen to redraw everything
         self._screen.fill(self._BG_COLOR)
+        self.invalidate_screen()
 
-        bold_font = pygame.font.Font("./FiraCode-SemiBold.ttf", 84)
-        text_surface = bold_font.render("Blokus", False, (0, 0, 0))
+        text_surface = self._render_text("Blokus", 84, face=self._TITLE_FONT)
         self._screen.blit(text_surface, (550, 200))
 
-        font = pygame.font.SysFont("Fira Code", 50)
         # Expand buttons when hovered over
         if play_button:
             pygame.draw.rect(
@@ -63,8 +180,7 @@ class GraphicsHandler:
                 width=3,
                 border_radius=20,
             )
-            font = pygame.font.SysFont("Fira Code", 44)
-            self._screen.blit(font.render("Start", False, (0, 0, 0)), (635, 426))
+            self._screen.blit(self._render_text("Start", 44), (635, 426))
         else:
             pygame.draw.rect(
                 self._screen,
@@ -73,8 +189,7 @@ class GraphicsHandler:
                 width=3,
                 border_radius=20,
             )
-            font = pygame.font.SysFont("Fira Code", 40)
-            self._screen.blit(font.render("Start", False, (0, 0, 0)), (640, 430))
+            self._screen.blit(self._render_text("Start", 40), (640, 430))
         if rules_button:
             pygame.draw.rect(
                 self._screen,
@@ -83,8 +198,7 @@ class GraphicsHandler:
                 width=3,
                 border_radius=20,
             )
-            font = pygame.font.SysFont("Fira Code", 44)
-            self._screen.blit(font.render("Rules", False, (0, 0, 0)), (635, 576))
+            self._screen.blit(self._render_text("Rules", 44), (635, 576))
         else:
             pygame.draw.rect(
                 self._screen,
@@ -93,8 +207,7 @@ class GraphicsHandler:
                 width=3,
                 border_radius=20,
             )
-            font = pygame.font.SysFont("Fira Code", 40)
-            self._screen.blit(font.render("Rules", False, (0, 0, 0)), (640, 580))
+            self._screen.blit(self._render_text("Rules", 40), (640, 580))
 
     def blur_screen(self):
         alpha_surface = pygame.Surface((1400, 750), pygame.SRCALPHA)
@@ -102,14 +215,15 @@ class GraphicsHandler:
         alpha_surface.fill(self._BG_COLOR + (alpha_value,))
 
         self._screen.blit(alpha_surface, (0, 0))
+        self.invalidate_screen()
 
     def update_about_screen(self, back_button):
         # Blur the rest of the screen
         rect = pygame.Rect(400, 75, 600, 625)
         pygame.draw.rect(self._screen, self._BG_COLOR, rect, border_radius=20)
         pygame.draw.rect(self._screen, (0, 0, 0), rect, width=5, border_radius=20)
+        self.invalidate_screen()
 
-        font = pygame.font.SysFont("Fira Code", 14)
         text = """
         The first piece played by each player must cover a corner\n 
         square. Each new piece must touch at least one other piece\n 
@@ -126,7 +240,7 @@ class GraphicsHandler:
         """
 
         for i, line in enumerate(text.splitlines()):
-            self._screen.blit(font.render(line, False, (0, 0, 0)), (360, 140 + 12 * i))
+            self._screen.blit(self._render_text(line, 14), (360, 140 + 12 * i))
 
         if back_button:
             pygame.draw.rect(
@@ -136,8 +250,7 @@ class GraphicsHandler:
                 width=3,
                 border_radius=20,
             )
-            font = pygame.font.SysFont("Fira Code", 44)
-            self._screen.blit(font.render("Back", False, (0, 0, 0)), (640, 531))
+            self._screen.blit(self._render_text("Back", 44), (640, 531))
         else:
             pygame.draw.rect(
                 self._screen,
@@ -146,65 +259,126 @@ class GraphicsHandler:
                 width=3,
                 border_radius=20,
             )
-            font = pygame.font.SysFont("Fira Code", 40)
-            self._screen.blit(font.render("Back", False, (0, 0, 0)), (645, 535))
+            self._screen.blit(self._render_text("Back", 40), (645, 535))
 
     def update_game_screen(
         self, game_board: GameBoard, current_player: int, players: list[Player]
     ) -> None:
-        """Updates the squares based on the state of the board."""
+        """Updates the parts of the game screen whose state changed since they were last drawn."""
+        if not self._game_screen_drawn:
+            self._draw_game_screen_background()
 
         # Turn indicator
-        font = pygame.font.SysFont("Fira Code", 30)
-        text_surface = font.render("'s turn", False, (0, 0, 0))
-        self._screen.blit(text_surface, (700, 70))
-        pygame.draw.rect(
-            self._screen, self._player_colors[current_player], (670, 70, 30, 30)
-        )
+        if self._drawn_turn != current_player:
+            self._drawn_turn = current_player
+            rect = pygame.draw.rect(
+                self._screen, self._player_colors[current_player], (670, 70, 30, 30)
+            )
+            self._dirty_rects.append(rect)
+
+        # The squares only change when the board or the shadow overlay changes
+        board_state = (game_board.version, game_board.shadow_cells)
+        if (
+            board_state[0] != self._drawn_board_state[0]
+            or board_state[1] is not self._drawn_board_state[1]
+        ):
+            self._drawn_board_state = board_state
+            self._update_game_squares(game_board)
 
+        for i in range(len(players)):
+            self._update_player_grid(i, current_player, players)
+
+    def _draw_game_screen_background(self) -> None:
+        """Draws the parts of the game screen that never change and forgets what was drawn."""
+        self._screen.fill(self._BG_COLOR)
+        text_surface = self._render_text("'s turn", 30)
+        self._screen.blit(text_surface, (700, 70))
         self._draw_game_grid()
 
+        self.invalidate_screen()
+        self._game_screen_drawn = True
+        self._drawn_board_state = (None, None)
+        self._drawn_cells = [[None] * 20 for _ in range(20)]
+        self._drawn_turn = None
+        self._drawn_trays = [None] * 4
+        self._drawn_highlights = [None] * 4
+        self._drawn_scores = [None] * 4
+
+    def _update_game_squares(self, game_board: GameBoard) -> None:
+        """Redraws the squares of the board whose color changed."""
         for row in range(game_board.height):
+            drawn_row = self._drawn_cells[row]
             for col in range(game_board.width):
-                color = game_board.shadow_board[row][col]
-                if color >= 0:
-                    pygame.draw.rect(
-                        self._screen,
-                        self._player_colors[color],
-                        (
-                            self._coordinates[col] + self._X_MARGIN + 1,
-                            self._coordinates[row] + self._Y_MARGIN + 1,
-                            self._GRID_BOX_SIZE,
-                            self._GRID_BOX_SIZE,
-                        ),
-                    )
-                else:
-                    pygame.draw.rect(
-                        self._screen,
-                        self._BG_COLOR,
-                        (
-                            self._coordinates[col] + self._X_MARGIN + 1,
-                            self._coordinates[row] + self._Y_MARGIN + 1,
-                            self._GRID_BOX_SIZE,
-                            self._GRID_BOX_SIZE,
-                        ),
-                    )
-
-        for i in range(len(players)):
-            self._draw_player_grid_pieces(i, players)
-            self._update_score_text(i, players)
-            self._draw_player_grid(i)
+                color = game_board.shadow_at(row, col)
+                if drawn_row[col] == color:
+                    continue
+                drawn_row[col] = color
+                rect = pygame.draw.rect(
+                    self._screen,
+                    self._player_colors[color] if color >= 0 else self._BG_COLOR,
+                    (
+                        self._coordinates[col] + self._X_MARGIN + 1,
+                        self._coordinates[row] + self._Y_MARGIN + 1,
+                        self._GRID_BOX_SIZE,
+                        self._GRID_BOX_SIZE,
+                    ),
+                )
+                self._dirty_rects.append(rect)
 
-        self._highlight_piece(current_player, players)
+    def _update_player_grid(
+        self, player_id: int, current_player: int, players: list[Player]
+    ) -> None:
+        """Redraws the parts of a player's grid and score box whose state changed."""
+        player = players[player_id]
+        highlighted = player.piece_id if player_id == current_player else None
+        tray = self._get_tray(player_id, player)
+        changed = False
+
+        if self._drawn_trays[player_id] != self._tray_pieces[player_id]:
+            # The pieces changed, so copy the whole grid over
+            self._drawn_trays[player_id] = self._tray_pieces[player_id]
+            rect = self._screen.blit(tray, self._player_grid_margins[player_id])
+            self._dirty_rects.append(rect)
+            self._drawn_scores[player_id] = None
+            changed = True
+        elif self._drawn_highlights[player_id] != highlighted:
+            # Erase the old highlight by copying its slot back from the tray
+            if self._drawn_highlights[player_id] is not None:
+                self._draw_player_grid_slot(
+                    player_id, self._drawn_highlights[player_id], tray
+                )
+            changed = True
+        self._drawn_highlights[player_id] = highlighted
+
+        if self._drawn_scores[player_id] != player.squares_left:
+            self._drawn_scores[player_id] = player.squares_left
+            self._update_score_text(player_id, players)
+
+        if changed and highlighted is not None:
+            self._highlight_piece(player_id, players)
+
+    def _get_tray(self, player_id: int, player: Player) -> pygame.Surface:
+        """Gets the cached surface of a player's grid, rebuilding it if their pieces changed."""
+        available_pieces = tuple(player.available_pieces)
+        if self._tray_pieces[player_id] != available_pieces:
+            self._tray_pieces[player_id] = available_pieces
+            tray = self._trays[player_id]
+            tray.fill(self._BG_COLOR)
+            for piece_id in available_pieces:
+                x = self._piece_coordinates_x[(piece_id - 1) % 5]
+                y = self._piece_coordinates_y[(piece_id - 1) // 5]
+                tray.blit(self._piece_sprites[player_id][piece_id], (x + 1, y + 1))
+            self._draw_player_grid(tray)
+        return self._trays[player_id]
 
     def update_game_over_screen(
         self, home_button: bool, scores: list[int], winners: list[int]
     ):
         # Fill in screen to redraw everything
         self._screen.fill(self._BG_COLOR)
+        self.invalidate_screen()
 
-        font = pygame.font.SysFont("Fira Code", 50)
-        text_surface = font.render("Winners: ", False, (0, 0, 0))
+        text_surface = self._render_text("Winners: ", 50)
         self._screen.blit(text_surface, (565 - 35 * len(winners), 150))
 
         for i in range(len(winners)):
@@ -214,14 +388,13 @@ class GraphicsHandler:
                 (775 + (50 + 25) * (i + 1) - 30 * len(winners), 150, 50, 50),
             )  # This just works trust
 
-        font = pygame.font.SysFont("Fira Code", 25)
         for i in range(len(scores)):
             pygame.draw.rect(
                 self._screen,
                 self._player_colors[i],
                 (200 + 312.5 * i, 330, 50, 50),
             )
-            text_surface = font.render(f"Score: {scores[i]}", False, (0, 0, 0))
+            text_surface = self._render_text(f"Score: {scores[i]}", 25)
             self._screen.blit(text_surface, (200 + 312.5 * i - 50, 440))
 
         # Expand button if hovered over
@@ -233,8 +406,7 @@ class GraphicsHandler:
                 width=3,
                 border_radius=20,
             )
-            font = pygame.font.SysFont("Fira Code", 44)
-            self._screen.blit(font.render("Home", False, (0, 0, 0)), (645, 576))
+            self._screen.blit(self._render_text("Home", 44), (645, 576))
         else:
             pygame.draw.rect(
                 self._screen,
@@ -243,8 +415,7 @@ class GraphicsHandler:
                 width=3,
                 border_radius=20,
             )
-            font = pygame.font.SysFont("Fira Code", 40)
-            self._screen.blit(font.render("Home", False, (0, 0, 0)), (650, 580))
+            self._screen.blit(self._render_text("Home", 40), (650, 580))
 
     def get_square_from_coords(self, coords):
         """Takes a set of coordinates and returns the position on the game board."""
@@ -293,93 +464,70 @@ class GraphicsHandler:
                 ),
             )
 
-    def _draw_player_grid(self, player_id: int):
-        """Draws the container grid that shows a player's available pieces."""
-        x_margin = self._player_grid_margins[player_id][0]
-        y_margin = self._player_grid_margins[player_id][1]
-
-        # Draw the grid
+    def _draw_player_grid(self, surface: pygame.Surface):
+        """Draws the container grid that shows a player's available pieces onto a tray surface."""
         for i in range(6):  # Draw columns
-            dest_y = y_margin + (
+            dest_y = (
                 self._piece_coordinates_y[-1]
                 if i in (0, 1, 5)
                 else self._piece_coordinates_y[-2]
             )
             pygame.draw.line(
-                self._screen,
+                surface,
                 self._LINE_COLOR,
-                (self._piece_coordinates_x[i] + x_margin, 0 + y_margin),
-                (
-                    self._piece_coordinates_x[i] + x_margin,
-                    dest_y,
-                ),
+                (self._piece_coordinates_x[i], 0),
+                (self._piece_coordinates_x[i], dest_y),
             )
         for i in range(6):  # Draw rows
             pygame.draw.line(
-                self._screen,
+                surface,
                 self._LINE_COLOR,
-                (0 + x_margin, self._piece_coordinates_y[i] + y_margin),
-                (
-                    self._piece_coordinates_x[-1] + x_margin,
-                    self._piece_coordinates_y[i] + y_margin,
-                ),
+                (0, self._piece_coordinates_y[i]),
+                (self._piece_coordinates_x[-1], self._piece_coordinates_y[i]),
             )
 
-    def _draw_player_grid_pieces(self, player_id: int, players: list[Player]):
-        """Draws the available pieces of each player onto grids."""
-        player = players[player_id]
-        x_margin = self._player_grid_margins[player_id][0]
-        y_margin = self._player_grid_margins[player_id][1]
-
-        piece_id = 1
-        # Go through coordinates of the grid
-        for y in self._piece_coordinates_y[:-1]:
-            for x in self._piece_coordinates_x[:-1]:
-                # Clear the space first (from highlights)
-                pygame.draw.rect(
-                    self._screen,
-                    self._BG_COLOR,
-                    (
-                        x + x_margin + 1,
-                        y + y_margin + 1,
-                        self._PLAYER_GRID_WIDTH,
-                        self._PLAYER_GRID_HEIGHT,
-                    ),
-                )
+    def _draw_piece_sprite(self, piece_id: int, color: tuple) -> pygame.Surface:
+        """Draws a piece centered in a surface the size of a grid slot."""
+        sprite = pygame.Surface((self._PLAYER_GRID_WIDTH, self._PLAYER_GRID_HEIGHT))
+        sprite.fill(self._BG_COLOR)
+        shape = PIECE_SHAPES[piece_id]
+
+        # Calculate the amount of padding needing so the piece is centered in the grid square
+        x_padding = (
+            self._PLAYER_GRID_WIDTH - self._PLAYER_GRID_BOX_SIZE * len(shape[0])
+        ) / 2
+        y_padding = (
+            self._PLAYER_GRID_HEIGHT - self._PLAYER_GRID_BOX_SIZE * len(shape)
+        ) / 2
+
+        # Display each square of each piece
+        for row in range(len(shape)):
+            for col in range(len(shape[0])):
+                if shape[row][col] == 0:
+                    pygame.draw.rect(
+                        sprite,
+                        color,
+                        (
+                            self._PLAYER_GRID_BOX_SIZE * col + x_padding,
+                            self._PLAYER_GRID_BOX_SIZE * row + y_padding,
+                            self._PLAYER_GRID_BOX_SIZE,
+                            self._PLAYER_GRID_BOX_SIZE,
+                        ),
+                    )
+        return sprite
 
-                # If piece is available show it
-                if piece_id in player.available_pieces:
-                    piece = player.pieces_copy[piece_id]
-
-                    # Calculate the amount of padding needing so the piece is centered in the grid square
-                    x_padding = (
-                        self._PLAYER_GRID_WIDTH
-                        - self._PLAYER_GRID_BOX_SIZE * len(piece[0])
-                    ) / 2
-                    y_padding = (
-                        self._PLAYER_GRID_HEIGHT
-                        - self._PLAYER_GRID_BOX_SIZE * len(piece)
-                    ) / 2
-
-                    # Display each square of each piece
-                    for row in range(len(piece)):
-                        for col in range(len(piece[0])):
-                            if piece[row][col] == 0:
-                                pygame.draw.rect(
-                                    self._screen,
-                                    self._player_colors[player_id],
-                                    (
-                                        (self._PLAYER_GRID_BOX_SIZE * col)
-                                        + (x + x_margin + 1)
-                                        + x_padding,
-                                        (self._PLAYER_GRID_BOX_SIZE * row)
-                                        + (y + y_margin + 1)
-                                        + y_padding,
-                                        self._PLAYER_GRID_BOX_SIZE,
-                                        self._PLAYER_GRID_BOX_SIZE,
-                                    ),
-                                )
-                piece_id += 1
+    def _draw_player_grid_slot(
+        self, player_id: int, piece_id: int, tray: pygame.Surface
+    ) -> None:
+        """Copies one slot of a player's grid, including its border, from the tray surface."""
+        x = self._piece_coordinates_x[(piece_id - 1) % 5]
+        y = self._piece_coordinates_y[(piece_id - 1) // 5]
+        area = pygame.Rect(
+            x, y, self._PLAYER_GRID_WIDTH + 2, self._PLAYER_GRID_HEIGHT + 2
+        )
+        x_margin, y_margin = self._player_grid_margins[player_id]
+        rect = self._screen.blit(tray, (x + x_margin, y + y_margin), area)
+        self._dirty_rects.append(rect)
 
     def _highlight_piece(self, player_id: int, players: list[Player]):
         player = players[player_id]
@@ -390,7 +538,7 @@ class GraphicsHandler:
         y = self._player_grid_margins[player_id][1] + (self._PLAYER_GRID_HEIGHT + 1) * (
             (piece_id - 1) // 5
         )
-        pygame.draw.rect(
+        rect = pygame.draw.rect(
             self._screen,
             self._HIGHLIGHT_COLOR,
             (
@@ -401,12 +549,12 @@ class GraphicsHandler:
             ),
             width=3,
         )
+        self._dirty_rects.append(rect)
 
     def _update_score_text(self, player_id: int, players: list[Player]):
         """Updates the score of each player in each box."""
         player = players[player_id]
-        font = pygame.font.SysFont("Fira Code", 20)
-        text_surface = font.render(f"Score: {-player.squares_left}", False, (0, 0, 0))
+        text_surface = self._render_text(f"Score: {-player.squares_left}", 20)
 
         # Calculate the upper-left coordinate of the bounding box of the text
         x_margin = self._player_grid_margins[player_id][0]
@@ -415,7 +563,7 @@ class GraphicsHandler:
         y = self._piece_coordinates_y[-2] + y_margin + 1
 
         # Clear the previous drawing
-        pygame.draw.rect(
+        rect = pygame.draw.rect(
             self._screen,
             self._BG_COLOR,
             (
@@ -425,6 +573,7 @@ class GraphicsHandler:
                 self._PLAYER_GRID_HEIGHT,
             ),
         )
+        self._dirty_rects.append(rect)
 
         # Update x and y to center the text
         x += 100
@@ -0,0 +1,326 @@
+from collections.abc import Iterator
+from copy import copy
+from typing import TYPE_CHECKING
+from bitboard_game_board import BitboardGameBoard
+from board_feed import BoardFeed
+from orientations import ORIENTATIONS, PIECES, Orientation
+from player import Player
+from zobrist import PIECE_KEYS, SIDE_KEYS
+
+if TYPE_CHECKING:
+    from game_record import GameRecordWriter
+
+
+class HeadlessGame:
+    """The rules and turn logic of a game of Blokus, without any graphics or input handling."""
+
+    def __init__(
+        self,
+        num_players: int = 4,
+        recorder: "GameRecordWriter | None" = None,
+        seed: int | None = None,
+    ):
+        self._num_players = num_players
+        self._board = BitboardGameBoard(20, 20)
+        self._players: list[Player] = []
+        for i in range(num_players):
+            self._players.append(Player("", i))
+        self._has_legal_moves = [True] * self._num_players
+        # A legal move of every player as a (piece_id, squares) pair, or None
+        # if one has to be searched for. It stays legal until a move covers
+        # it or the player uses the piece or touches it, so most turns don't
+        # need a search to know that a player can still move.
+        self._known_moves: list[tuple | None] = [None] * self._num_players
+        self._game_over = False
+        self._current_player = -1
+        # Undo records of the moves played so far
+        self._history: list[tuple] = []
+        # Zobrist key of the pieces that have been used, the board keeps its own key
+        self._pieces_key = 0
+        # Every move and undo is streamed to the recorder, which starts a new
+        # game in its file. Whoever made the recorder ends the game.
+        self._recorder = recorder
+        if recorder is not None:
+            recorder.begin_game(num_players, seed)
+        self._update_turn()
+
+    @property
+    def num_players(self):
+        return self._num_players
+
+    @property
+    def board(self):
+        return self._board
+
+    @property
+    def players(self):
+        return self._players
+
+    @property
+    def current_player(self):
+        return self._current_player
+
+    @property
+    def has_legal_moves(self):
+        return self._has_legal_moves
+
+    @property
+    def game_over(self):
+        return self._game_over
+
+    @property
+    def history(self):
+        return self._history
+
+    @property
+    def moves(self) -> list[tuple[int, int, int, int, int]]:
+        """The (player_id, piece_id, orientation, row, col) moves played so far, oldest first."""
+        return [(record[2], *record[0][:4]) for record in self._history]
+
+    @property
+    def zobrist_key(self) -> int:
+        """A key of the position: the board, the remaining pieces and the player to move."""
+        return (
+            self._board.zobrist_key ^ self._pieces_key ^ SIDE_KEYS[self._current_player]
+        )
+
+    def start_feed(self, snapshot_interval: int = 16) -> BoardFeed:
+        """
+        Starts streaming the changes to the board, with one delta for every
+        move or undo. Returns the feed to subscribe to.
+        """
+        if self._board.feed is None:
+            self._board.set_feed(
+                BoardFeed(
+                    self._board,
+                    self._num_players,
+                    -1 if self._game_over else self._current_player,
+                    [player.remaining for player in self._players],
+                    snapshot_interval,
+                )
+            )
+        return self._board.feed
+
+    def copy(self) -> "HeadlessGame":
+        """Copies the state of the game, so that it can be played on without changing this one."""
+        game = copy(self)
+        game._board = self._board.copy()
+        # Moves played on a copy are never recorded
+        game._recorder = None
+        game._players = [player.copy() for player in self._players]
+        game._has_legal_moves = list(self._has_legal_moves)
+        game._known_moves = list(self._known_moves)
+        game._history = list(self._history)
+        return game
+
+    def can_play_move(self, player_id: int | None = None) -> bool:
+        """Checks if a player, by default the current one, has any legal moves."""
+        if player_id is None:
+            player_id = self._current_player
+        # Every corner anchor is a legal move for the 1 square piece
+        if self._players[player_id].has_piece(1) and (
+            self._board.corner_anchors(player_id)
+        ):
+            return True
+        if self._known_moves[player_id] is None:
+            self._known_moves[player_id] = self._find_known_move(player_id)
+        return self._known_moves[player_id] is not None
+
+    def forget_known_moves(self) -> None:
+        """Forgets the legal move known for every player, so the next checks search again."""
+        self._known_moves = [None] * self._num_players
+
+    def _find_known_move(self, player_id: int) -> tuple | None:
+        """Finds a legal move of a player, trying the smallest pieces first."""
+        available_pieces = self._players[player_id].available_pieces
+        if not available_pieces:
+            return None
+
+        # After the first move, a piece can only fit at an anchor if the
+        # anchor's pocket of free squares is at least as big as the piece.
+        # Near the end of the game that rules out most pieces far more
+        # cheaply than trying all their placements.
+        if not self._board.first_move:
+            sizes = [PIECES[piece_id].size for piece_id in available_pieces]
+            largest_piece = max(sizes)
+            largest_pocket = 0
+            for row, col in self._board.corner_anchors(player_id):
+                largest_pocket = max(
+                    largest_pocket,
+                    self._board.free_region_size(row, col, player_id, largest_piece),
+                )
+                if largest_pocket == largest_piece:
+                    break
+            available_pieces = [
+                piece_id
+                for piece_id, size in zip(available_pieces, sizes)
+                if size <= largest_pocket
+            ]
+
+        for piece_id in available_pieces:
+            for orientation in ORIENTATIONS[piece_id]:
+                placement = self._board.find_placement(orientation, player_id)
+                if placement is not None:
+                    squares = self._move_squares(orientation, *placement)
+                    return piece_id, frozenset(squares)
+        return None
+
+    def _move_squares(self, orientation: Orientation, row: int, col: int) -> list[int]:
+        """Gets the squares a move covers, as row * width + col."""
+        width = self._board.width
+        return [(row + i) * width + col + j for i, j in orientation.cells]
+
+    def _update_known_moves(
+        self, piece_id: int, orientation: Orientation, row: int, col: int
+    ) -> None:
+        """Forgets the known moves that a move made illegal."""
+        player_id = self._current_player
+        squares = self._move_squares(orientation, row, col)
+        for i, known_move in enumerate(self._known_moves):
+            if known_move is None:
+                continue
+            if i != player_id:
+                # Other players' moves stay legal unless they were covered
+                if not known_move[1].isdisjoint(squares):
+                    self._known_moves[i] = None
+                continue
+
+            # The player's own move also can't use the piece or touch its
+            # sides. Squares next to each other in the numbering can be on
+            # different rows, which only forgets a move that was still legal.
+            width = self._board.width
+            known_squares = known_move[1]
+            if known_move[0] == piece_id or any(
+                square in known_squares
+                or square - 1 in known_squares
+                or square + 1 in known_squares
+                or square - width in known_squares
+                or square + width in known_squares
+                for square in squares
+            ):
+                self._known_moves[i] = None
+
+    def legal_moves(self) -> Iterator[tuple[int, int, int, int]]:
+        """Lazily yields every legal (piece_id, orientation, row, col) move of the current player."""
+        player = self._players[self._current_player]
+        return self._board.legal_moves(self._current_player, player.available_pieces)
+
+    def is_move_legal(
+        self, piece_id: int, orientation: int, row: int, col: int
+    ) -> bool:
+        """Checks if the current player can play a move."""
+        if self._game_over:
+            return False
+        if not self._players[self._current_player].has_piece(piece_id):
+            return False
+        if not 0 <= orientation < len(ORIENTATIONS[piece_id]):
+            return False
+        return self._board.is_orientation_valid(
+            ORIENTATIONS[piece_id][orientation], row, col, self._current_player
+        )
+
+    def apply_move(self, piece_id: int, orientation: int, row: int, col: int) -> bool:
+        """
+        Plays a move for the current player and passes the turn on. Players
+        without any legal moves are skipped. Returns False if the move is illegal.
+        """
+        if (
+            row < 0
+            or col < 0
+            or not self.is_move_legal(piece_id, orientation, row, col)
+        ):
+            return False
+        player_id = self._current_player
+        # The player goes first, since it is the step that can raise, so a
+        # failed move never leaves a piece on the board without an undo record
+        player_record = self._players[player_id].apply_move(piece_id)
+        board_record = self._board.apply_move(
+            piece_id, orientation, row, col, player_id
+        )
+        self._history.append(
+            (
+                board_record,
+                player_record,
+                player_id,
+                tuple(self._has_legal_moves),
+                self._board.first_move,
+                tuple(self._known_moves),
+            )
+        )
+        self._update_known_moves(
+            piece_id, ORIENTATIONS[piece_id][orientation], row, col
+        )
+        self._pieces_key ^= PIECE_KEYS[player_id][piece_id]
+        if self._recorder is not None:
+            self._recorder.write_move(player_id, piece_id, orientation, row, col)
+        self._update_turn()
+        feed = self._board.feed
+        if feed is not None:
+            feed.record_turn(-1 if self._game_over else self._current_player)
+            feed.flush()
+        return True
+
+    def undo_move(self) -> bool:
+        """Takes back the last move, returning False if there is no move to take back."""
+        if not self._history:
+            return False
+        (
+            board_record,
+            player_record,
+            player_id,
+            has_legal_moves,
+            first_move,
+            known_moves,
+        ) = self._history.pop()
+        self._board.undo_move(board_record)
+        self._players[player_id].undo_move(player_record)
+        self._pieces_key ^= PIECE_KEYS[player_id][board_record[0]]
+        self._board.set_first_move(first_move)
+        self._current_player = player_id
+        self._has_legal_moves = list(has_legal_moves)
+        self._known_moves = list(known_moves)
+        self._game_over = False
+        if self._recorder is not None:
+            self._recorder.write_undo()
+        feed = self._board.feed
+        if feed is not None:
+            feed.record_turn(player_id)
+            feed.flush()
+        return True
+
+    def _update_turn(self) -> None:
+        """Updates current_player to the ID of the next player that can still move."""
+        for _ in range(self._num_players):
+            if self._current_player + 1 == self._num_players:
+                if self._board.first_move:
+                    # Moves that were legal as first moves don't have to be anymore
+                    self.forget_known_moves()
+                self._board.toggle_first_move()
+            self._current_player = (self._current_player + 1) % self._num_players
+
+            if not self._has_legal_moves[self._current_player]:
+                continue
+            if self.can_play_move():
+                return
+            self._has_legal_moves[self._current_player] = False
+
+        # Every player had to pass
+        self._game_over = True
+
+    def scores(self) -> list[int]:
+        """Calculates the score of every player."""
+        scores = []
+        for player in self._players:
+            score = -player.squares_left
+            if len(player.available_pieces) == 0:
+                score += 15
+                if player.last_piece_played == 1:
+                    score += 5
+            scores.append(score)
+        return scores
+
+    def winners(self) -> list[int]:
+        """Finds the player(s) with the highest score."""
+        scores = self.scores()
+        max_score = max(scores)
+        return [i for i, score in enumerate(scores) if score == max_score]
@@ -0,0 +1,229 @@
+"""
+Measures how many games a game server sustains on one core, by playing
+recorded random games through it from many connections at once.
+
+Example: python src/load_test.py --games 2000 --concurrency 200
+
+Unless --connect is given, the server is started in its own process on a
+Unix socket, so its CPU time can be told apart from the clients'. The moves
+are worked out up front, so the clients only have to send them.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from game_client import parse_address
+from self_play import play_games
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_server.py")
+
+
+class LoadStats:
+    """What the clients saw: finished games and moves, and how long moves took."""
+
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.errors = 0
+        # Seconds from sending a move until the server sent it back
+        self.latencies: list[float] = []
+
+
+async def _connect(address: str):
+    target = parse_address(address)
+    if isinstance(target, str):
+        return await asyncio.open_unix_connection(target)
+    return await asyncio.open_connection(*target)
+
+
+async def _play_seat(
+    address: str,
+    name: str,
+    num_players: int,
+    moves: list,
+    stats: LoadStats,
+) -> None:
+    """Plays the moves of one seat of a recorded game, until the game is over."""
+    reader, writer = await _connect(address)
+    seat = None
+    own_moves = iter(())
+    sent_at = 0.0
+
+    def send_next_move():
+        nonlocal sent_at
+        _, piece_id, orientation, row, col = next(own_moves)
+        message = {
+            "type": "move",
+            "piece": piece_id,
+            "orientation": orientation,
+            "row": row,
+            "col": col,
+        }
+        writer.write(json.dumps(message).encode() + b"\n")
+        sent_at = time.perf_counter()
+
+    writer.write(
+        json.dumps({"type": "join", "game": name, "players": num_players}).encode()
+        + b"\n"
+    )
+    try:
+        while line := await reader.readline():
+            message = json.loads(line)
+            kind = message["type"]
+            if kind == "joined":
+                seat = message["seat"]
+                own_moves = iter([move for move in moves if move[0] == seat])
+            elif kind == "start" and seat == 0:
+                send_next_move()
+            elif kind == "move":
+                if message["player"] == seat:
+                    stats.latencies.append(time.perf_counter() - sent_at)
+                    stats.moves += 1
+                if message["next"] == seat:
+                    send_next_move()
+            elif kind == "game_over":
+                if seat == 0:
+                    stats.games += 1
+                break
+            elif kind in ("error", "timeout"):
+                stats.errors += 1
+                break
+    finally:
+        writer.close()
+
+
+async def _run_clients(
+    address: str, games: list[dict], total: int, concurrency: int, stats: LoadStats
+) -> None:
+    """Keeps concurrency games going until total games have been played."""
+    next_game = 0
+
+    async def play_games_in_turn():
+        nonlocal next_game
+        while next_game < total:
+            index = next_game
+            next_game += 1
+            game = games[index % len(games)]
+            num_players = len(game["policies"])
+            name = f"load-{index}"
+            await asyncio.gather(
+                *(
+                    _play_seat(address, name, num_players, game["moves"], stats)
+                    for _ in range(num_players)
+                )
+            )
+
+    await asyncio.gather(*(play_games_in_turn() for _ in range(concurrency)))
+
+
+def _start_server(path: str, workers: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            SERVER,
+            "--unix",
+            path,
+            "--move-timeout",
+            "0",
+            "--workers",
+            str(workers),
+        ],
+        stderr=subprocess.DEVNULL,
+    )
+    while not os.path.exists(path):
+        if server.poll() is not None:
+            raise RuntimeError("the game server didn't start")
+        time.sleep(0.05)
+    return server
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=1000, help="games to play")
+    parser.add_argument(
+        "--concurrency", type=int, default=100, help="games played at the same time"
+    )
+    parser.add_argument("--players", type=int, default=4, help="number of players")
+    parser.add_argument(
+        "--distinct", type=int, default=32, help="different recorded games to play"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="seed of the games")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="executor threads of the server"
+    )
+    parser.add_argument(
+        "--connect", metavar="ADDRESS", help="load a server that is already running"
+    )
+    args = parser.parse_args(argv)
+
+    distinct = min(args.distinct, args.games)
+    with ProcessPoolExecutor() as executor:
+        chunks = executor.map(
+            play_games,
+            [["random"] * args.players] * distinct,
+            range(distinct),
+            [1] * distinct,
+            [args.seed] * distinct,
+        )
+        games = [game for chunk in chunks for game in chunk]
+
+    stats = LoadStats()
+    with tempfile.TemporaryDirectory() as directory:
+        server = None
+        address = args.connect
+        if address is None:
+            address = os.path.join(directory, "server.sock")
+            server = _start_server(address, args.workers)
+        # Only the server is a child process from here on
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        clients_before = time.process_time()
+        start = time.perf_counter()
+        try:
+            asyncio.run(
+                _run_clients(address, games, args.games, args.concurrency, stats)
+            )
+        finally:
+            elapsed = time.perf_counter() - start
+            clients_cpu = time.process_time() - clients_before
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    print(
+        f"{stats.games} games, {stats.moves} moves in {elapsed:.1f}s "
+        f"with {args.concurrency} games at a time "
+        f"({stats.games / elapsed:.1f} games/s, {stats.moves / elapsed:.0f} moves/s)"
+    )
+    if stats.latencies:
+        latencies = sorted(stats.latencies)
+        print(
+            f"move latency: median {statistics.median(latencies) * 1000:.1f}ms, "
+            f"99th percentile {latencies[len(latencies) * 99 // 100] * 1000:.1f}ms"
+        )
+    if stats.errors:
+        print(f"{stats.errors} clients got an error or a timeout")
+    print(f"client CPU time: {clients_cpu:.1f}s")
+    if server is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        server_cpu = (
+            children.ru_utime
+            + children.ru_stime
+            - children_before.ru_utime
+            - children_before.ru_stime
+        )
+        print(
+            f"server CPU time: {server_cpu:.1f}s, "
+            f"{stats.games / server_cpu:.1f} games/s per core"
+        )
+
+
+if __name__ == "__main__":
+    main()
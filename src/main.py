@@ -1,26 +1,146 @@
+import argparse
+import os
+from itertools import islice
 import pygame
+from frame_profiler import FrameProfiler
 from game import Game
+from game_client import GameClient
+from game_record import GameRecordWriter, map_games
+from policies import POLICIES
+from replay import Replay
+
+parser = argparse.ArgumentParser(description="Play Blokus")
+parser.add_argument(
+    "--computer",
+    action="append",
+    default=[],
+    metavar="SEAT=POLICY",
+    help=f"let a policy play a seat (0-3), e.g. 1=greedy (policies: {', '.join(POLICIES)})",
+)
+parser.add_argument(
+    "--record", metavar="PATH", help="append the games that are played to a record file"
+)
+parser.add_argument(
+    "--replay", metavar="PATH", help="step through a game of a record file instead"
+)
+parser.add_argument(
+    "--replay-game",
+    type=int,
+    default=0,
+    metavar="N",
+    help="which game of the record file to replay, counting from 0",
+)
+parser.add_argument(
+    "--connect",
+    metavar="ADDRESS",
+    help="play on a game server, at HOST:PORT or a Unix socket path",
+)
+parser.add_argument(
+    "--online-game",
+    default="lobby",
+    metavar="NAME",
+    help="which game of the server to join",
+)
+parser.add_argument(
+    "--spectate", action="store_true", help="watch the online game instead"
+)
+args = parser.parse_args()
+if args.connect and (args.computer or args.replay):
+    parser.error("--connect can't be used with --computer or --replay")
+computer_players = {}
+for computer in args.computer:
+    seat, _, policy = computer.partition("=")
+    if policy not in POLICIES or seat not in ("0", "1", "2", "3"):
+        parser.error(f"invalid computer player {computer!r}")
+    computer_players[int(seat)] = POLICIES[policy]()
+
+# Frame timing is turned on by BLOKUS_PROFILE=1 or by pressing F3, which also
+# toggles the overlay. F4 runs cProfile for BLOKUS_CPROFILE_FRAMES frames,
+# which also starts a capture right away when it is set.
+profiler = FrameProfiler(os.environ.get("BLOKUS_PROFILE", "0") not in ("", "0"))
+profile_output = os.environ.get("BLOKUS_PROFILE_OUTPUT", "frame_profile.json")
+capture_frames = int(os.environ.get("BLOKUS_CPROFILE_FRAMES", "0"))
+capture_output = os.environ.get("BLOKUS_CPROFILE_OUTPUT", "frame_profile.prof")
+if capture_frames > 0:
+    profiler.start_capture(capture_frames, capture_output)
+show_overlay = False
 
 # Game setup
 pygame.init()
-game = Game(4)
+client = None
+record_file = open(args.record, "ab") if args.record else None
+recorder = GameRecordWriter(record_file) if record_file else None
+if args.replay:
+    record = next(islice(map_games(args.replay), args.replay_game, None), None)
+    if record is None:
+        parser.error(f"{args.replay} doesn't have game {args.replay_game}")
+    game = Game(record.num_players, profiler=profiler)
+    game.start_replay(Replay(record))
+else:
+    client = GameClient(args.connect) if args.connect else None
+    game = Game(
+        4, computer_players, profiler, recorder, client, args.online_game, args.spectate
+    )
 clock = pygame.time.Clock()
 running = True
+mouse_pos = None
 
 while running:
+    profiler.begin_frame()
     # poll for events
     # pygame.QUIT event means the user clicked X to close window
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
-        elif event.type == pygame.KEYDOWN:
-            game.handle_keyboard(event)
-        pos = pygame.mouse.get_pos()
-        game.handle_mouse(event, pos)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            show_overlay = not show_overlay
+            profiler.enabled = profiler.enabled or show_overlay
+            if not show_overlay:
+                game.draw_overlay(None)
+            continue
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+            profiler.start_capture(capture_frames or 300, capture_output)
+            continue
+        elif event.type == pygame.MOUSEMOTION:
+            # Only the latest position matters, so motion is handled once per frame
+            mouse_pos = event.pos
+            continue
+        with profiler.section("events"):
+            if event.type == pygame.KEYDOWN:
+                game.handle_keyboard(event)
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                # The click is newer than any motion before it
+                game.handle_mouse(event, event.pos)
+                mouse_pos = None
+    if mouse_pos is not None:
+        with profiler.section("events"):
+            game.handle_mouse_motion(mouse_pos)
+        mouse_pos = None
+    game.update_network()
+    game.update_computer_player()
+
+    # At most one redraw per frame, and none if nothing changed
+    game.update()
 
-    # flip() the display to put your work on screen
-    pygame.display.flip()
+    # Only push the parts of the screen that were redrawn to the display. The
+    # overlay text changes twice a second, but the screens can draw over it
+    dirty_rects = game.pop_dirty_rects()
+    if show_overlay and (dirty_rects or profiler.frames % 30 == 0):
+        game.draw_overlay(profiler.summary_lines())
+        dirty_rects += game.pop_dirty_rects()
+    if dirty_rects:
+        with profiler.section("display"):
+            pygame.display.update(dirty_rects)
+    profiler.end_frame()
 
     clock.tick(60)  # limits FPS to 60
 
+profiler.stop_capture()
+if profiler.frames:
+    profiler.dump(profile_output)
+if client is not None:
+    client.close()
+if recorder is not None:
+    recorder.close()
+    record_file.close()
 pygame.quit()
@@ -0,0 +1,198 @@
+from typing import NamedTuple
+
+# Base shapes of the 21 pieces, indexed by piece ID (0 is the empty placeholder piece).
+# 0 marks a filled square and -1 marks an empty one.
+PIECE_SHAPES = [
+    [[]],
+    [[0]],  # 1-I (1)
+    [[0, 0]],  # 2-I (2)
+    [[0, 0, 0]],  # 3-L (3)
+    [[-1, 0], [0, 0]],  # 3-I (4)
+    # Tetrominoes
+    [[-1, 0], [0, 0], [0, -1]],  # 4-S (5)
+    [[0, 0], [0, 0]],  # 4-O (6)
+    [[-1, 0, -1], [0, 0, 0]],  # 4-T (7)
+    [[0, 0, 0], [-1, -1, 0]],  # 4-L (8)
+    [[0, 0, 0, 0]],  # 4-I (9)
+    # Pentominoes
+    [[-1, 0], [0, 0], [0, 0]],  # 5-P (10)
+    [[0, 0], [0, -1], [0, 0]],  # 5-U (11)
+    [[-1, -1, 0], [0, 0, 0], [-1, -1, 0]],  # 5-T (12)
+    [[-1, 0], [-1, 0], [0, 0], [0, -1]],  # 5-S (13)
+    [[-1, 0, 0], [-1, 0, -1], [0, 0, -1]],  # 5-Z (14)
+    [[-1, 0, -1], [-1, 0, 0], [0, 0, -1]],  # 5-F (15)
+    [[0, 0, 0, 0], [-1, -1, -1, 0]],  # 5-L (16)
+    [[-1, 0, 0], [0, 0, -1], [0, -1, -1]],  # 5-W (17)
+    [[-1, 0, -1], [0, 0, 0], [-1, 0, -1]],  # 5-X (18)
+    [[0, 0, 0, 0, 0]],  # 5-I (19)
+    [[-1, -1, 0], [-1, -1, 0], [0, 0, 0]],  # 5-V (20)
+    [[-1, 0, -1, -1], [0, 0, 0, 0]],  # 5-Y (21)
+]
+
+
+class Orientation(NamedTuple):
+    """A single fixed orientation of a piece, along with its precomputed offsets."""
+
+    piece_id: int
+    index: int  # Position of the orientation in ORIENTATIONS[piece_id]
+    shape: tuple  # Rows of 0 (filled) / -1 (empty), like Piece.shape
+    height: int
+    width: int
+    cells: tuple  # (row, col) offsets of every filled square
+    corners: tuple  # (row, col) offsets of the squares that can touch another piece diagonally
+    mask: int  # Bit row * width + col is set for every filled square
+    number: int  # Position of the orientation among all 91, counting piece by piece
+
+
+def _rotate_clockwise(shape: tuple) -> tuple:
+    return tuple(zip(*shape[::-1]))
+
+
+def _rotate_counterclockwise(shape: tuple) -> tuple:
+    return tuple(zip(*shape))[::-1]
+
+
+def _flip_vertically(shape: tuple) -> tuple:
+    return shape[::-1]
+
+
+def _flip_horizontally(shape: tuple) -> tuple:
+    return tuple(tuple(reversed(row)) for row in shape)
+
+
+def _transform_shapes(base_shape: list) -> list[tuple]:
+    """
+    Gets the shape of a piece after each of the 8 transforms, where
+    transform 4 * flipped + rotations flips the base shape horizontally if
+    flipped and then rotates it clockwise.
+    """
+    shapes = []
+    shape = tuple(tuple(row) for row in base_shape)
+    for mirrored in (shape, _flip_horizontally(shape)):
+        for _ in range(4):
+            shapes.append(mirrored)
+            mirrored = _rotate_clockwise(mirrored)
+    return shapes
+
+
+def _find_corners(cells: tuple) -> tuple:
+    """
+    Finds the squares that have a free diagonal, i.e. a diagonal whose two
+    neighbouring side squares are both outside the piece.
+    """
+    filled = set(cells)
+    corners = []
+    for row, col in cells:
+        for d_row, d_col in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+            if (row + d_row, col) not in filled and (row, col + d_col) not in filled:
+                corners.append((row, col))
+                break
+    return tuple(corners)
+
+
+def _build_orientations(
+    piece_id: int, base_shape: list, first_number: int
+) -> list[Orientation]:
+    """Builds all of the unique orientations of a piece, numbering them from first_number."""
+    orientations = []
+    seen = set()
+    for shape in _transform_shapes(base_shape):
+        if shape not in seen:
+            seen.add(shape)
+            width = len(shape[0])
+            cells = tuple(
+                (i, j)
+                for i in range(len(shape))
+                for j in range(width)
+                if shape[i][j] == 0
+            )
+            orientations.append(
+                Orientation(
+                    piece_id,
+                    len(orientations),
+                    shape,
+                    len(shape),
+                    width,
+                    cells,
+                    _find_corners(cells),
+                    sum(1 << (i * width + j) for i, j in cells),
+                    first_number + len(orientations),
+                )
+            )
+    return orientations
+
+
+# ORIENTATIONS[piece_id] lists the unique orientations of that piece (91 in total)
+ORIENTATIONS: list[list[Orientation]] = [[]]
+for _piece_id in range(1, len(PIECE_SHAPES)):
+    ORIENTATIONS.append(
+        _build_orientations(
+            _piece_id,
+            PIECE_SHAPES[_piece_id],
+            sum(len(piece_orientations) for piece_orientations in ORIENTATIONS),
+        )
+    )
+NUM_ORIENTATIONS = sum(len(piece_orientations) for piece_orientations in ORIENTATIONS)
+
+_ORIENTATIONS_BY_SHAPE = {
+    orientation.shape: orientation
+    for piece_orientations in ORIENTATIONS
+    for orientation in piece_orientations
+}
+
+
+# TRANSFORMS[piece_id][transform] is the orientation of a piece after one of
+# the 8 transforms of _transform_shapes. Symmetric pieces share entries.
+TRANSFORMS: list[tuple[Orientation, ...]] = [()] + [
+    tuple(_ORIENTATIONS_BY_SHAPE[shape] for shape in _transform_shapes(base_shape))
+    for base_shape in PIECE_SHAPES[1:]
+]
+
+
+def _transform_table(operation) -> tuple[int, ...]:
+    """
+    Finds the transform that every transform turns into after an operation,
+    using the F piece, which has 8 different orientations.
+    """
+    shapes = _transform_shapes(PIECE_SHAPES[15])
+    return tuple(shapes.index(operation(shape)) for shape in shapes)
+
+
+# The transform a piece has after rotating or flipping it, indexed by its current transform
+ROTATE_CLOCKWISE = _transform_table(_rotate_clockwise)
+ROTATE_COUNTERCLOCKWISE = _transform_table(_rotate_counterclockwise)
+FLIP_VERTICALLY = _transform_table(_flip_vertically)
+FLIP_HORIZONTALLY = _transform_table(_flip_horizontally)
+
+
+def find_transform(piece_id: int, shape) -> int | None:
+    """Finds the transform that gives a piece a shape, or None if no transform does."""
+    shape = tuple(tuple(row) for row in shape)
+    for transform, orientation in enumerate(TRANSFORMS[piece_id]):
+        if orientation.shape == shape:
+            return transform
+    return None
+
+
+class PieceType(NamedTuple):
+    """Everything about a piece that doesn't depend on who holds it or how it is turned."""
+
+    piece_id: int
+    size: int  # Number of squares
+    orientations: tuple  # The unique orientations, like ORIENTATIONS[piece_id]
+    transforms: tuple  # The orientation after each transform, like TRANSFORMS[piece_id]
+
+
+# PIECES[piece_id] is shared by every player of every game, and is never changed
+PIECES: tuple[PieceType, ...] = tuple(
+    PieceType(
+        piece_id,
+        len(ORIENTATIONS[piece_id][0].cells) if piece_id else 0,
+        tuple(ORIENTATIONS[piece_id]),
+        TRANSFORMS[piece_id],
+    )
+    for piece_id in range(len(PIECE_SHAPES))
+)
+
+# Bit piece_id is set for every real piece
+ALL_PIECES = sum(1 << piece_id for piece_id in range(1, len(PIECE_SHAPES)))
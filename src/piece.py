@@ -1,15 +1,36 @@
-from typing import List
+from orientations import (
+    FLIP_HORIZONTALLY,
+    FLIP_VERTICALLY,
+    ROTATE_CLOCKWISE,
+    ROTATE_COUNTERCLOCKWISE,
+    TRANSFORMS,
+    Orientation,
+    find_transform,
+)
 
 
 class Piece:
-    def __init__(self, shape: List[List[int]], id: int):
-        self._shape = shape
+    """
+    A piece in one of its 8 transforms. The shapes, bitmasks and cells of
+    every transform are precomputed in the orientation table, so a piece only
+    stores its ID and which transform it is in, and rotating or flipping it
+    just picks another transform.
+    """
+
+    __slots__ = ("_id", "_transforms", "_transform", "_orientation", "_mirror")
+
+    def __init__(self, shape: list[list[int]], id: int):
+        self._id = id
+        self._transforms = TRANSFORMS[id]
+        self._transform = 0
+        # The shape can be given in any of the piece's orientations
+        if self._transforms:
+            self.shape = shape
         self._orientation = 0  # 0: normal, 1: (clockwise) 90, 180, 270
         self._mirror = 0  # 0: normal, 1: vertical, 2: horizontal
-        self._id = id
 
     def __str__(self):
-        return str(self._shape)
+        return str(self.shape)
 
     def __len__(self):
         return len(self.shape)
@@ -17,81 +38,127 @@ class Piece:
     def __getitem__(self, idx):
         return self.shape[idx]
 
+    @classmethod
+    def from_transform(cls, id: int, transform: int = 0) -> "Piece":
+        """
+        Makes a piece that is already in a transform, without searching for
+        its shape. Its orientation and mirror count from the base shape.
+        """
+        piece = cls.__new__(cls)
+        piece._id = id
+        piece._transforms = TRANSFORMS[id]
+        piece._transform = transform
+        piece._orientation = transform % 4
+        piece._mirror = 2 if transform >= 4 else 0
+        return piece
+
+    def __copy__(self) -> "Piece":
+        piece = Piece.from_transform(self._id, self._transform)
+        piece._orientation = self._orientation
+        piece._mirror = self._mirror
+        return piece
+
+    def __deepcopy__(self, memo) -> "Piece":
+        # The transforms are shared and never change
+        return self.__copy__()
+
     def rotate_clockwise(self):
         """Rotates the piece clockwise."""
-        self.shape = [list(elem) for elem in list(zip(*self.shape[::-1]))]
-        self.orientation += 1
+        self._transform = ROTATE_CLOCKWISE[self._transform]
+        self._orientation = (self._orientation + 1) % 4
 
     def rotate_counterclockwise(self):
         """Rotates the piece counterclockwise."""
-        self.shape = [list(elem) for elem in list(zip(*self.shape))[::-1]]
-        self.orientation -= 1
+        self._transform = ROTATE_COUNTERCLOCKWISE[self._transform]
+        self._orientation = (self._orientation - 1) % 4
 
     def flip_vertically(self):
         """Flips the piece vertically."""
-        # Flip piece vertically by appending from last to first row
-        self.shape = [self.shape[i] for i in range(len(self.shape) - 1, -1, -1)]
-        self.mirror += 1
+        self._transform = FLIP_VERTICALLY[self._transform]
+        self._add_mirror(1)
 
     def flip_horizontally(self):
         """Flips the piece horizontally."""
-        # Flip piece horizontally by reversing every row
-        self._shape = [list(reversed(elem)) for elem in self.shape]
-        self.mirror += 2
+        self._transform = FLIP_HORIZONTALLY[self._transform]
+        self._add_mirror(2)
+
+    def _add_mirror(self, flip: int) -> None:
+        if self._mirror == flip:
+            self._mirror = 0
+        # Mirrored horizontally + vertically is equal to rotated 180 degrees
+        elif self._mirror:
+            self._mirror = 0
+            self._orientation = (self._orientation + 2) % 4
+        else:
+            self._mirror = flip
 
     @property
-    def shape(self):
-        return self._shape
+    def id(self):
+        return self._id
 
     @property
-    def orientation(self):
-        return self._orientation
+    def transform(self):
+        """Which of the 8 transforms the piece is in: 4 * flipped + clockwise rotations."""
+        return self._transform
 
     @property
-    def mirror(self):
-        return self._mirror
+    def table_orientation(self) -> Orientation | None:
+        """The entry of the orientation table for the current transform, None for the empty piece."""
+        if not self._transforms:
+            return None
+        return self._transforms[self._transform]
+
+    @property
+    def shape(self) -> tuple:
+        """Rows of 0 (filled) / -1 (empty) squares."""
+        if not self._transforms:
+            return ((),)
+        return self._transforms[self._transform].shape
 
     @shape.setter
     def shape(self, value):
-        self._shape = value
+        """Turns the piece to a shape, which has to be one of its orientations."""
+        transform = find_transform(self._id, value)
+        # 0 is a transform too, so only None means the shape doesn't fit
+        if transform is None:
+            raise ValueError(f"{value} is not an orientation of piece {self._id}")
+        self._transform = transform
 
-    @orientation.setter
-    def orientation(self, value):
-        """The orientation value of the piece. Clockwise adds, counterclockwise subtracts"""
-        self._orientation = value % 4
+    @property
+    def mask(self) -> int:
+        """The filled squares as a bitmask, where bit row * width + col is a square."""
+        if not self._transforms:
+            return 0
+        return self._transforms[self._transform].mask
 
-    @mirror.setter
-    def mirror(self, value):
-        """
-        Sets the mirror value of the piece. The values represent:
-        0: original
-        1: vertical
-        2: horizontally
-        """
-        # Piece is being flipped vertically
-        if value == self.mirror + 1:
-            if self.mirror == 1:
-                self._mirror = 0
-            # Mirrored horizontally + vertical is equal to rotated 180 degrees
-            elif self.mirror == 2:
-                self._mirror = 0
-                self.orientation += 2
-            else:
-                self._mirror = 1
-        # Piece is being flipped horizontally
-        elif value == self.mirror + 2:
-            if self.mirror == 2:
-                self._mirror = 0
-            elif self.mirror == 1:
-                self.mirror = 0
-                self.orientation += 2
-            else:
-                self._mirror = 2
+    @property
+    def width(self) -> int:
+        if not self._transforms:
+            return 0
+        return self._transforms[self._transform].width
+
+    @property
+    def height(self) -> int:
+        if not self._transforms:
+            return 1
+        return self._transforms[self._transform].height
+
+    @property
+    def cells(self) -> tuple:
+        """(row, col) offsets of the filled squares."""
+        if not self._transforms:
+            return ()
+        return self._transforms[self._transform].cells
+
+    @property
+    def orientation(self):
+        """The clockwise rotations of the piece: 0 for normal, then 90, 180 and 270 degrees."""
+        return self._orientation
+
+    @property
+    def mirror(self):
+        """How the piece is flipped: 0 for not at all, 1 vertically, 2 horizontally."""
+        return self._mirror
 
     def get_num_squares(self) -> int:
-        squares = 0
-        for i in range(len(self.shape)):
-            for j in range(len(self.shape[0])):
-                if self.shape[i][j] == 0:
-                    squares += 1
-        return squares
+        return len(self.cells)
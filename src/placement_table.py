@@ -0,0 +1,204 @@
+import marshal
+import mmap
+import os
+import struct
+import sys
+import zlib
+from orientations import NUM_ORIENTATIONS, ORIENTATIONS, Orientation
+
+# The cache files are kept in BLOKUS_CACHE_DIR, or ~/.cache/blokus by
+# default. Setting it to an empty string turns the cache off.
+CACHE_DIR = os.environ.get(
+    "BLOKUS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "blokus")
+)
+
+# A cache file is a header, the offsets of the placements of every
+# orientation in the file (one more than there are orientations, so the
+# last one is the end of the file), and then the placements of every
+# orientation in the order of Orientation.number, each as a list dumped by
+# marshal. Reading marshal is about twice as fast as turning fixed-width raw
+# masks back into ints, but its format depends on the Python version, so the
+# header and the file name both have the version the file was written by.
+MAGIC = b"BLKP"
+VERSION = 2
+_HEADER = struct.Struct("<4sHHBBHHHI")
+_OFFSET = struct.Struct("<I")
+
+# A checksum of the orientation table, so a cache of other pieces is never loaded
+_FINGERPRINT = zlib.crc32(
+    repr(
+        [[orientation.cells for orientation in piece] for piece in ORIENTATIONS]
+    ).encode()
+)
+
+_BY_NUMBER = [
+    orientation
+    for piece_orientations in ORIENTATIONS
+    for orientation in piece_orientations
+]
+
+
+def _orientation_masks(orientation: Orientation, stride: int) -> tuple[int, int, int]:
+    """
+    Builds the (cells, edges, corners) masks of an orientation placed at
+    row 0, col 0 of a board that is padded by one square on every side.
+    """
+    filled = set(orientation.cells)
+    edges = set()
+    corners = set()
+    for i, j in orientation.cells:
+        for d_i, d_j in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            edges.add((i + d_i, j + d_j))
+        for d_i, d_j in ((-1, -1), (-1, 1), (1, -1), (1, 1)):
+            corners.add((i + d_i, j + d_j))
+    edges -= filled
+    corners -= filled | edges
+
+    def to_mask(squares):
+        mask = 0
+        for i, j in squares:
+            mask |= 1 << ((i + 1) * stride + j + 1)
+        return mask
+
+    return to_mask(filled), to_mask(edges), to_mask(corners)
+
+
+class _LazyPlacements(dict):
+    """Maps orientation numbers to their placements, loading them on first use."""
+
+    def __init__(self, load):
+        super().__init__()
+        self._load = load
+
+    def __missing__(self, number: int) -> list:
+        placements = self[number] = self._load(number)
+        return placements
+
+
+class PlacementTable:
+    """
+    The (cells, edges, corners) bitmasks of every placement of every
+    orientation on a board, in the layout of GameBoard. They never
+    depend on the state of the game, so a validity check only has to look
+    them up.
+
+    The placements of an orientation are only built, or read from the memory
+    mapped cache file, the first time they are used.
+    """
+
+    def __init__(self, width: int, height: int, data=None):
+        self._width = width
+        self._height = height
+        self._stride = width + 2
+        self._data = data
+        self._placements = _LazyPlacements(self._build if data is None else self._read)
+
+    @property
+    def stride(self):
+        return self._stride
+
+    @property
+    def by_number(self) -> dict[int, list[tuple[int, int, int] | None]]:
+        """The placements of every orientation by Orientation.number, for hot loops."""
+        return self._placements
+
+    @classmethod
+    def load(
+        cls, width: int, height: int, cache_dir: str | None = None
+    ) -> "PlacementTable":
+        """
+        Maps the table from its cache file, building and saving the file
+        first if it is missing or out of date.
+        """
+        if cache_dir is None:
+            cache_dir = CACHE_DIR
+        if not cache_dir:
+            return cls(width, height)
+        python = "{}{}".format(*sys.version_info[:2])
+        path = os.path.join(
+            cache_dir, f"placements-{width}x{height}-v{VERSION}-py{python}.bin"
+        )
+        header = _header(width, height)
+        try:
+            with open(path, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            end = _OFFSET.unpack_from(
+                data, _HEADER.size + NUM_ORIENTATIONS * _OFFSET.size
+            )
+            if data[: _HEADER.size] == header and end[0] == len(data):
+                return cls(width, height, data)
+            data.close()
+        except (OSError, ValueError, struct.error):
+            # A missing, empty or cut off file is built again
+            pass
+
+        table = cls(width, height)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Other processes may be reading the old file, so it is replaced in one go
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(table.dump())
+            os.replace(temp_path, path)
+        except OSError:
+            # The table works without the cache, it just has to be built next time
+            pass
+        return table
+
+    def dump(self) -> bytes:
+        """Serializes the whole table in the format of the cache file."""
+        blobs = [
+            marshal.dumps(self._placements[number])
+            for number in range(NUM_ORIENTATIONS)
+        ]
+        offsets = []
+        offset = _HEADER.size + (NUM_ORIENTATIONS + 1) * _OFFSET.size
+        for blob in blobs:
+            offsets.append(_OFFSET.pack(offset))
+            offset += len(blob)
+        offsets.append(_OFFSET.pack(offset))
+        return b"".join([_header(self._width, self._height), *offsets, *blobs])
+
+    def placements(self, orientation: Orientation) -> list[tuple[int, int, int] | None]:
+        """
+        Gets the (cells, edges, corners) masks of an orientation at every
+        row * width + col, or None where it would go off the board.
+        """
+        return self._placements[orientation.number]
+
+    def _build(self, number: int) -> list[tuple[int, int, int] | None]:
+        orientation = _BY_NUMBER[number]
+        cells, edges, corners = _orientation_masks(orientation, self._stride)
+        placements = []
+        for row in range(self._height):
+            for col in range(self._width):
+                if (
+                    row + orientation.height > self._height
+                    or col + orientation.width > self._width
+                ):
+                    placements.append(None)
+                else:
+                    shift = row * self._stride + col
+                    placements.append(
+                        (cells << shift, edges << shift, corners << shift)
+                    )
+        return placements
+
+    def _read(self, number: int) -> list[tuple[int, int, int] | None]:
+        position = _HEADER.size + number * _OFFSET.size
+        start = _OFFSET.unpack_from(self._data, position)[0]
+        end = _OFFSET.unpack_from(self._data, position + _OFFSET.size)[0]
+        return marshal.loads(self._data[start:end])
+
+
+def _header(width: int, height: int) -> bytes:
+    return _HEADER.pack(
+        MAGIC,
+        VERSION,
+        marshal.version,
+        *sys.version_info[:2],
+        width,
+        height,
+        NUM_ORIENTATIONS,
+        _FINGERPRINT,
+    )
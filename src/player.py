@@ -1,67 +1,45 @@
 from piece import Piece
-from copy import deepcopy
+from orientations import (
+    ALL_PIECES,
+    FLIP_HORIZONTALLY,
+    FLIP_VERTICALLY,
+    PIECES,
+    ROTATE_CLOCKWISE,
+    ROTATE_COUNTERCLOCKWISE,
+)
+from copy import copy
+
+# Every player starts with all of the pieces, which cover 89 squares
+_ALL_PIECE_IDS = tuple(range(1, len(PIECES)))
+_TOTAL_SQUARES = sum(piece.size for piece in PIECES)
 
 
 class Player:
-    """Represents a Blokus player. Can do a bunch of fancy stuff with pieces"""
+    """
+    Represents a Blokus player. The pieces themselves are shared by everyone
+    through orientations.PIECES, a player only keeps which ones they have
+    left and which one they have selected.
+    """
+
+    __slots__ = (
+        "_name",
+        "_id",
+        "_remaining",
+        "_available_pieces",
+        "_piece_id",
+        "_transform",
+        "_squares_left",
+        "_last_piece_played",
+    )
 
     def __init__(self, name: str, player_id: int):
         self._name = name
         self._id = player_id
-        self._pieces: list[Piece] = [Piece([[]], 0)]  # Default starts with empty
+        self._remaining = ALL_PIECES  # Bit piece_id is set while the piece is left
+        self._available_pieces = _ALL_PIECE_IDS
         self._piece_id: int = 1
-
-        self._pieces.append(Piece([[0]], 1))  # 1-I (1)
-        self._pieces.append(Piece([[0, 0]], 2))  # 2-I (2)
-        self._pieces.append(Piece([[0, 0, 0]], 3))  # 3-L (3)
-        self._pieces.append(Piece([[-1, 0], [0, 0]], 4))  # 3-I (4)
-
-        # Tetrominoes
-        self._pieces.append(Piece([[-1, 0], [0, 0], [0, -1]], 5))  # 4-S (5)
-        self._pieces.append(Piece([[0, 0], [0, 0]], 6))  # 4-O (6)
-        self._pieces.append(Piece([[-1, 0, -1], [0, 0, 0]], 7))  # 4-T (7)
-        self._pieces.append(Piece([[0, 0, 0], [-1, -1, 0]], 8))  # 4-L (8)
-        self._pieces.append(Piece([[0, 0, 0, 0]], 9))  # 4-I (9)
-
-        # Pentominoes
-        self._pieces.append(Piece([[-1, 0], [0, 0], [0, 0]], 10))  # 5-P (10)
-        self._pieces.append(Piece([[0, 0], [0, -1], [0, 0]], 11))  # 5-U (11)
-        self._pieces.append(
-            Piece([[-1, -1, 0], [0, 0, 0], [-1, -1, 0]], 12)
-        )  # 5-T (12)
-        self._pieces.append(
-            Piece(
-                [
-                    [-1, 0],
-                    [-1, 0],
-                    [0, 0],
-                    [0, -1],
-                ],
-                13,
-            )  # 5-S (13)
-        )
-        self._pieces.append(
-            Piece([[-1, 0, 0], [-1, 0, -1], [0, 0, -1]], 14)
-        )  # 5-Z (14)
-        self._pieces.append(
-            Piece([[-1, 0, -1], [-1, 0, 0], [0, 0, -1]], 15)
-        )  # 5-F (15)
-        self._pieces.append(Piece([[0, 0, 0, 0], [-1, -1, -1, 0]], 16))  # 5-L (16)
-        self._pieces.append(
-            Piece([[-1, 0, 0], [0, 0, -1], [0, -1, -1]], 17)
-        )  # 5-W (17)
-        self._pieces.append(
-            Piece([[-1, 0, -1], [0, 0, 0], [-1, 0, -1]], 18)
-        )  # 5-X (18)
-        self._pieces.append(Piece([[0, 0, 0, 0, 0]], 19))  # 5-I (19)
-        self._pieces.append(
-            Piece([[-1, -1, 0], [-1, -1, 0], [0, 0, 0]], 20)
-        )  # 5-V (20)
-        self._pieces.append(Piece([[-1, 0, -1, -1], [0, 0, 0, 0]], 21))  # 5-Y (21)
-
-        self._pieces_copy = deepcopy(self._pieces)
-        self._available_pieces = [_ for _ in range(1, 22)]
-        self._squares_left = 89
+        self._transform = 0  # Transform of the selected piece, see Piece.transform
+        self._squares_left = _TOTAL_SQUARES
         self._last_piece_played = None
 
     @property
@@ -83,17 +61,22 @@ class Player:
     @piece_id.setter
     def piece_id(self, piece_id) -> None:
         """Sets the selected piece of the player."""
-        if piece_id in self._available_pieces:
+        if self.has_piece(piece_id):
             self._piece_id = piece_id
         else:
             pass  # TODO: Raise
 
     @property
-    def pieces_copy(self):
-        return self._pieces_copy
+    def transform(self):
+        return self._transform
 
     @property
-    def available_pieces(self):
+    def remaining(self) -> int:
+        """Bitset of the pieces left, where bit piece_id is set if the piece is left."""
+        return self._remaining
+
+    @property
+    def available_pieces(self) -> tuple[int, ...]:
         return self._available_pieces
 
     @property
@@ -104,28 +87,67 @@ class Player:
     def last_piece_played(self):
         return self._last_piece_played
 
+    def has_piece(self, piece_id: int) -> bool:
+        """Checks if the player still has a piece."""
+        return 0 < piece_id < len(PIECES) and self._remaining >> piece_id & 1 == 1
+
+    def copy(self) -> "Player":
+        """Copies the state of the player."""
+        return copy(self)
+
     def get_piece(self) -> Piece:
-        """Gets the selected piece of the player."""
-        if self._piece_id in self._available_pieces:
-            return self._pieces[
-                self._piece_id
-            ]  # Don't return copy piece because it doesn't keep the orientation
+        """Gets the selected piece of the player, in the selected transform."""
+        if self.has_piece(self._piece_id):
+            return Piece.from_transform(self._piece_id, self._transform)
         else:
-            return self._pieces[0]
+            return Piece.from_transform(0)
 
-    def set_to_lowest_value_piece(self) -> None:
-        """Sets the piece_id to whichever piece has the lowest ID."""
-        for i in range(1, 22):
-            if i in self._available_pieces:
-                self._piece_id = i
-                break
+    def rotate_clockwise(self) -> None:
+        self._transform = ROTATE_CLOCKWISE[self._transform]
+
+    def rotate_counterclockwise(self) -> None:
+        self._transform = ROTATE_COUNTERCLOCKWISE[self._transform]
+
+    def flip_vertically(self) -> None:
+        self._transform = FLIP_VERTICALLY[self._transform]
 
-    def use_piece(self) -> None:
-        self._available_pieces.remove(self._piece_id)
-        self._squares_left -= self._pieces[self._piece_id].get_num_squares()
+    def flip_horizontally(self) -> None:
+        self._transform = FLIP_HORIZONTALLY[self._transform]
 
-        self._last_piece_played = self._piece_id
+    def set_to_lowest_value_piece(self) -> None:
+        """Sets the piece_id to whichever piece has the lowest ID."""
+        if self._remaining:
+            # Isolates the lowest set bit
+            self._piece_id = (self._remaining & -self._remaining).bit_length() - 1
+
+    def use_piece(self, piece_id: int | None = None) -> None:
+        """Uses up a piece, which is the selected piece unless another ID is given."""
+        self.apply_move(self._piece_id if piece_id is None else piece_id)
+
+    def apply_move(self, piece_id: int) -> tuple[int, int | None, int]:
+        """Uses up a piece, and returns the record to undo it with."""
+        if not self.has_piece(piece_id):
+            raise ValueError(f"player {self._id} doesn't have piece {piece_id}")
+        record = (piece_id, self._last_piece_played, self._piece_id)
+        self._set_remaining(self._remaining & ~(1 << piece_id))
+        self._squares_left -= PIECES[piece_id].size
+
+        self._last_piece_played = piece_id
         self.set_to_lowest_value_piece()
+        return record
+
+    def undo_move(self, record: tuple[int, int | None, int]) -> None:
+        """Gives back a piece used by apply_move."""
+        piece_id, self._last_piece_played, self._piece_id = record
+        self._set_remaining(self._remaining | 1 << piece_id)
+        self._squares_left += PIECES[piece_id].size
+
+    def _set_remaining(self, remaining: int) -> None:
+        # The IDs are kept as a tuple too, since most callers loop over them
+        self._remaining = remaining
+        self._available_pieces = tuple(
+            piece_id for piece_id in _ALL_PIECE_IDS if remaining >> piece_id & 1
+        )
 
     def left_piece(self) -> None:
         if not (self._piece_id - 1) % 5 == 0 and self.piece_id > 1:
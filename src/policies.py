@@ -0,0 +1,44 @@
+import random
+from collections.abc import Callable
+from functools import partial
+from computer_players import MonteCarloTreeSearch, greedy_policy
+from game_board import unpack_move
+from headless_game import HeadlessGame
+from orientations import ORIENTATIONS
+
+# A policy picks the (piece_id, orientation, row, col) move for the current player
+Policy = Callable[[HeadlessGame, random.Random], tuple[int, int, int, int]]
+
+
+def random_policy(game: HeadlessGame, rng: random.Random) -> tuple[int, int, int, int]:
+    """Picks one of the legal moves uniformly at random."""
+    player = game.players[game.current_player]
+    moves = game.board.legal_moves_array(game.current_player, player.available_pieces)
+    return unpack_move(moves[rng.randrange(len(moves))])
+
+
+def biggest_piece_policy(
+    game: HeadlessGame, rng: random.Random
+) -> tuple[int, int, int, int]:
+    """Picks a random legal move with the piece that covers the most squares."""
+    player = game.players[game.current_player]
+    pieces = sorted(
+        player.available_pieces,
+        key=lambda piece_id: len(ORIENTATIONS[piece_id][0].cells),
+        reverse=True,
+    )
+    for piece_id in pieces:
+        moves = game.board.legal_moves_array(game.current_player, [piece_id])
+        if moves:
+            return unpack_move(moves[rng.randrange(len(moves))])
+    raise ValueError("The current player has no legal moves")
+
+
+# Makes the policy of each name. The tree search keeps state between moves,
+# so every seat of every game gets a policy of its own.
+POLICIES: dict[str, Callable[[], Policy]] = {
+    "random": lambda: random_policy,
+    "biggest": lambda: biggest_piece_policy,
+    "greedy": lambda: greedy_policy,
+    "mcts": partial(MonteCarloTreeSearch, playouts=500, playout_depth=8),
+}
@@ -0,0 +1,93 @@
+from collections.abc import Iterable, Iterator
+from game_record import GameRecord, RecordError, map_games
+from headless_game import HeadlessGame
+
+
+class Replay:
+    """
+    Steps through a recorded game. A copy of the game is kept every
+    keyframe_interval moves, so seeking to any move only has to play the
+    moves since the keyframe before it, or take back a few moves.
+    """
+
+    def __init__(self, record: GameRecord, keyframe_interval: int = 16):
+        self._record = record
+        self._moves = [move[1:] for move in record.moves]
+        self._interval = keyframe_interval
+
+        # Playing through the game once checks it and makes the keyframes,
+        # where keyframe i is the game after i * keyframe_interval moves
+        game = HeadlessGame(record.num_players)
+        self._keyframes: list[HeadlessGame] = []
+        for number, (player_id, *move) in enumerate(record.moves):
+            if number % keyframe_interval == 0:
+                self._keyframes.append(game.copy())
+            if player_id != game.current_player or not game.apply_move(*move):
+                raise RecordError(f"move {number} {tuple(move)} can't be played")
+        if len(self._moves) % keyframe_interval == 0:
+            self._keyframes.append(game.copy())
+
+        self._game = self._keyframes[0].copy()
+        self._position = 0
+
+    @property
+    def record(self):
+        return self._record
+
+    @property
+    def game(self):
+        """The game after the current move. Seeking changes it in place or replaces it."""
+        return self._game
+
+    @property
+    def position(self):
+        """The number of moves that have been played."""
+        return self._position
+
+    @property
+    def num_moves(self):
+        return len(self._moves)
+
+    def seek(self, position: int) -> HeadlessGame:
+        """Goes to the game after a number of moves, clamped to the length of the game."""
+        position = max(0, min(position, len(self._moves)))
+        if position < self._position and self._position - position < self._interval:
+            # Going back a few moves is cheaper by taking them back
+            while self._position > position:
+                self._game.undo_move()
+                self._position -= 1
+            return self._game
+
+        keyframe = position // self._interval
+        if position < self._position or keyframe * self._interval > self._position:
+            self._game = self._keyframes[keyframe].copy()
+            self._position = keyframe * self._interval
+        while self._position < position:
+            self._game.apply_move(*self._moves[self._position])
+            self._position += 1
+        return self._game
+
+    def step(self, moves: int = 1) -> HeadlessGame:
+        """Moves forwards, or backwards if moves is negative."""
+        return self.seek(self._position + moves)
+
+
+def iter_positions(
+    paths: Iterable[str],
+) -> Iterator[tuple[GameRecord, int, HeadlessGame]]:
+    """
+    Walks every game of some record files through memory maps, yielding
+    (record, moves played, game) for the start of every game and after
+    every move. The same game object is played on between yields, so it
+    has to be copied to be kept.
+    """
+    for path in paths:
+        for record in map_games(path):
+            game = HeadlessGame(record.num_players)
+            yield record, 0, game
+            for number, (player_id, *move) in enumerate(record.moves, 1):
+                if player_id != game.current_player or not game.apply_move(*move):
+                    raise RecordError(
+                        f"move {number - 1} {tuple(move)} can't be played"
+                    )
+                yield record, number, game
@@ -0,0 +1,200 @@
+"""
+Plays many games between computer policies across all CPU cores and streams
+the finished games to a file as they complete.
+
+Example: python src/self_play.py --games 10000 --policies random,biggest --output games.jsonl
+
+The record format writes the binary game records of game_record.py, which
+take half the space of the compact format and a fifth of jsonl.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from game_board import pack_move
+from game_record import GameRecordWriter
+from headless_game import HeadlessGame
+from policies import POLICIES
+
+
+def play_game(policy_names: list[str], seed: int) -> dict:
+    """Plays a single game, with policy_names[i] choosing the moves of player i."""
+    rng = random.Random(seed)
+    game = HeadlessGame(len(policy_names))
+    policies = [POLICIES[name]() for name in policy_names]
+    moves = []
+    while not game.game_over:
+        player_id = game.current_player
+        move = policies[player_id](game, rng)
+        if not game.apply_move(*move):
+            raise ValueError(f"Policy {policy_names[player_id]} played {move}")
+        moves.append((player_id, *move))
+    return {
+        "seed": seed,
+        "policies": policy_names,
+        "moves": moves,
+        "scores": game.scores(),
+        "winners": game.winners(),
+    }
+
+
+def play_games(policy_names: list[str], first_game: int, count: int, seed: int):
+    """Plays a chunk of games in a worker. Every game gets its own seed from its index."""
+    results = []
+    for index in range(first_game, first_game + count):
+        result = play_game(policy_names, game_seed(seed, index))
+        result["game"] = index
+        results.append(result)
+    return results
+
+
+def game_seed(seed: int, index: int) -> int:
+    """Derives the seed of a game, so any game can be replayed on its own."""
+    return random.Random(f"{seed}:{index}").getrandbits(63)
+
+
+def format_game(result: dict, output_format: str) -> str:
+    """Formats a finished game as one line of the output file."""
+    if output_format == "jsonl":
+        return json.dumps(result, separators=(",", ":"))
+
+    # Compact lines are "game seed scores moves", where every move is
+    # player << 18 | pack_move(...) written in hex
+    moves = " ".join(
+        format(player_id << 18 | pack_move(*move), "x")
+        for player_id, *move in result["moves"]
+    )
+    scores = ",".join(str(score) for score in result["scores"])
+    return f"{result['game']} {result['seed']} {scores} {moves}"
+
+
+def run(
+    num_games: int,
+    policy_names: list[str],
+    seed: int,
+    workers: int,
+    chunk_size: int,
+    output,
+    output_format: str,
+) -> None:
+    """Plays the games across a process pool, writing each chunk as soon as it finishes."""
+    start = time.perf_counter()
+    games_done = 0
+    moves_done = 0
+    last_report = start
+    chunks = (
+        (first_game, min(chunk_size, num_games - first_game))
+        for first_game in range(0, num_games, chunk_size)
+    )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only keep a couple of chunks per worker in flight, so results never pile up in memory
+        pending = set()
+        for first_game, count in chunks:
+            pending.add(
+                executor.submit(play_games, policy_names, first_game, count, seed)
+            )
+            if len(pending) < workers * 2:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                games, moves = _write_results(future.result(), output, output_format)
+                games_done += games
+                moves_done += moves
+
+            now = time.perf_counter()
+            if now - last_report >= 5:
+                last_report = now
+                _report(games_done, moves_done, now - start)
+
+        for future in wait(pending).done:
+            games, moves = _write_results(future.result(), output, output_format)
+            games_done += games
+            moves_done += moves
+
+    _report(games_done, moves_done, time.perf_counter() - start)
+
+
+def _write_results(results: list[dict], output, output_format: str) -> tuple[int, int]:
+    for result in results:
+        if output_format == "record":
+            output.write_game(len(result["policies"]), result["moves"], result["seed"])
+        else:
+            output.write(format_game(result, output_format))
+            output.write("\n")
+    output.flush()
+    return len(results), sum(len(result["moves"]) for result in results)
+
+
+def _report(games: int, moves: int, elapsed: float) -> None:
+    print(
+        f"{games} games, {moves} moves in {elapsed:.1f}s "
+        f"({games / elapsed:.1f} games/s, {moves / elapsed:.0f} moves/s)",
+        file=sys.stderr,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=100, help="number of games")
+    parser.add_argument(
+        "--policies",
+        default="random",
+        help="comma-separated policy of each player, or one policy for all "
+        f"(available: {', '.join(POLICIES)})",
+    )
+    parser.add_argument("--players", type=int, default=4, help="number of players")
+    parser.add_argument("--seed", type=int, default=0, help="base seed of the games")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="number of processes"
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=16, help="games sent to a worker at once"
+    )
+    parser.add_argument(
+        "--format",
+        choices=("jsonl", "compact", "record"),
+        default="jsonl",
+        dest="output_format",
+    )
+    parser.add_argument("--output", default="-", help="output file, - for stdout")
+    args = parser.parse_args(argv)
+
+    policy_names = args.policies.split(",")
+    if len(policy_names) == 1:
+        policy_names *= args.players
+    if len(policy_names) != args.players:
+        parser.error(f"expected 1 or {args.players} policies")
+    for name in policy_names:
+        if name not in POLICIES:
+            parser.error(f"unknown policy {name!r}")
+
+    binary = args.output_format == "record"
+    if args.output == "-":
+        file = sys.stdout.buffer if binary else sys.stdout
+    else:
+        file = open(args.output, "wb" if binary else "w")
+    output = GameRecordWriter(file) if binary else file
+    try:
+        run(
+            args.games,
+            policy_names,
+            args.seed,
+            args.workers,
+            args.chunk_size,
+            output,
+            args.output_format,
+        )
+    finally:
+        if binary:
+            output.close()
+        if file not in (sys.stdout, sys.stdout.buffer):
+            file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from array import array
+
+
+class TranspositionTable:
+    """
+    A fixed size table of values keyed by Zobrist keys, so a search can reuse
+    the work it did on positions it reaches through a different move order.
+
+    The table has 2 ** size_bits slots and never grows. When two keys land
+    in the same slot, the new entry replaces the old one if the old one is
+    from an earlier search or the new one has at least the same priority,
+    e.g. the number of moves left to search below the position.
+    """
+
+    def __init__(self, size_bits: int = 16):
+        self._size = 1 << size_bits
+        self._mask = self._size - 1
+        self._keys = array("Q", bytes(8 * self._size))
+        self._values: list = [None] * self._size
+        self._priorities = array("i", bytes(4 * self._size))
+        self._generations = array("I", bytes(4 * self._size))
+        self._generation = 1  # Generation 0 marks empty slots
+        self._entries = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self) -> int:
+        return self._entries
+
+    def lookup(self, key: int):
+        """Gets the value stored for a key, or None if it isn't in the table."""
+        slot = key & self._mask
+        if self._generations[slot] and self._keys[slot] == key:
+            self.hits += 1
+            return self._values[slot]
+        self.misses += 1
+        return None
+
+    def store(self, key: int, value, priority: int = 0) -> bool:
+        """Stores a value for a key, returning False if the slot kept its old entry."""
+        slot = key & self._mask
+        generation = self._generations[slot]
+        if (
+            generation
+            and self._keys[slot] != key
+            and generation == self._generation
+            and priority < self._priorities[slot]
+        ):
+            return False
+
+        if not generation:
+            self._entries += 1
+        self._keys[slot] = key
+        self._values[slot] = value
+        self._priorities[slot] = priority
+        self._generations[slot] = self._generation
+        return True
+
+    def new_search(self) -> None:
+        """Marks every stored entry as old, so new entries can always replace them."""
+        self._generation += 1
+
+    def clear(self) -> None:
+        """Removes every entry from the table."""
+        self._values = [None] * self._size
+        self._generations = array("I", bytes(4 * self._size))
+        self._generation = 1
+        self._entries = 0
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,28 @@
+import random
+
+# The keys are generated from a fixed seed, so the same position always has the same key
+_rng = random.Random(0x5EED_B10C)
+
+# PIECE_KEYS[player_id][piece_id] is XORed in once the player has used the piece
+PIECE_KEYS = [[_rng.getrandbits(64) for _ in range(22)] for _ in range(4)]
+
+# SIDE_KEYS[player_id] is XORed in when it is that player's turn
+SIDE_KEYS = [_rng.getrandbits(64) for _ in range(4)]
+
+# XORed in while players are still placing their first piece
+FIRST_MOVE_KEY = _rng.getrandbits(64)
+
+_cell_keys: dict[int, list[list[int]]] = {}
+
+
+def cell_keys(num_squares: int) -> list[list[int]]:
+    """
+    Gets the keys of every square, where cell_keys(...)[player_id][row * width + col]
+    is XORed in while the player owns that square.
+    """
+    if num_squares not in _cell_keys:
+        rng = random.Random(num_squares)
+        _cell_keys[num_squares] = [
+            [rng.getrandbits(64) for _ in range(num_squares)] for _ in range(4)
+        ]
+    return _cell_keys[num_squares]
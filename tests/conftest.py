@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The game's modules are imported by bare name, like the scripts in src do
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
@@ -0,0 +1,77 @@
+import random
+import numpy as np
+import pytest
+from batch_env import (
+    NUM_ACTIONS,
+    NUM_CELLS,
+    NUM_TRANSFORMS,
+    BatchEnv,
+    action_to_move,
+    move_to_action,
+)
+from headless_game import HeadlessGame
+from piece import Piece
+
+
+def check_lockstep(
+    num_envs: int, num_players: int, seed: int = 0, samples: int = 3
+) -> int:
+    """
+    Plays random legal actions on a BatchEnv and on HeadlessGames until all
+    of the games are over, checking that the legal action masks, boards,
+    turns and scores agree. A few random actions per board are also checked
+    against GameBoard.is_placement_valid. Returns the number of steps played.
+    """
+    rng = random.Random(seed)
+    env = BatchEnv(num_envs, num_players)
+    games = [HeadlessGame(num_players) for _ in range(num_envs)]
+    steps = 0
+    while True:
+        mask = env.legal_action_mask()
+        for env_id, game in enumerate(games):
+            assert bool(env.done[env_id]) == game.game_over, (env_id, steps)
+            if game.game_over:
+                assert not mask[env_id].any(), (env_id, steps)
+                continue
+            assert env.current_players[env_id] == game.current_player
+            legal = {move_to_action(*move) for move in game.legal_moves()}
+            assert set(np.flatnonzero(mask[env_id]).tolist()) == legal
+
+            player = game.players[game.current_player]
+            for _ in range(samples):
+                action = rng.randrange(NUM_ACTIONS)
+                piece_id, orientation, row, col = action_to_move(action)
+                transform = action // NUM_CELLS % NUM_TRANSFORMS
+                # Only the first transform of an orientation is ever legal
+                expected = (
+                    player.has_piece(piece_id)
+                    and move_to_action(piece_id, orientation, row, col) == action
+                    and game.board.is_placement_valid(
+                        Piece.from_transform(piece_id, transform),
+                        row,
+                        col,
+                        game.current_player,
+                    )
+                )
+                assert bool(mask[env_id, action]) == expected, (env_id, action)
+        if env.done.all():
+            break
+
+        actions = np.zeros(num_envs, np.int64)
+        for env_id, game in enumerate(games):
+            if not game.game_over:
+                legal = np.flatnonzero(mask[env_id])
+                actions[env_id] = legal[rng.randrange(len(legal))]
+                assert game.apply_move(*action_to_move(actions[env_id]))
+        env.step(actions)
+        steps += 1
+        boards = np.array([game.board.board for game in games])
+        assert (env.boards == boards).all(), steps
+
+    assert (env.scores() == np.array([game.scores() for game in games])).all()
+    return steps
+
+
+@pytest.mark.parametrize("num_players", [2, 3, 4])
+def test_lockstep(num_players):
+    assert check_lockstep(num_envs=4, num_players=num_players, seed=0) > 0